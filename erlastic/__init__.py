@@ -32,7 +32,8 @@
 __version__ = "2.0.0"
 __license__ = "BSD"
 
-from erlastic.codec import ErlangTermDecoder, ErlangTermEncoder
+from erlastic.codec import ErlangTermDecoder, ErlangTermEncoder, TupleView, ListView
+from erlastic.port import PortDriver
 from erlastic.types import *
 
 encode = ErlangTermEncoder().encode
@@ -44,14 +45,14 @@ def mailbox_gen():
   while True:
     len_bin = sys.stdin.buffer.read(4)
     if len(len_bin) != 4:
-      yield None
+      return
     (length,) = struct.unpack('!I',len_bin)
     yield decode(sys.stdin.buffer.read(length))
 def port_gen():
   while True:
     term = encode((yield))
-    sys.stdout.buffer.write(struct.pack('!I',len(term)))
-    sys.stdout.buffer.write(term)
+    sys.stdout.buffer.write(struct.pack('!I',len(term)) + term)
+    sys.stdout.buffer.flush()
 def port_connection():
   port = port_gen()
   next(port)
@@ -29,6 +29,7 @@
 
 from __future__ import division
 
+import functools
 import struct
 import zlib
 import six
@@ -36,32 +37,223 @@ import six
 from erlastic.constants import *
 from erlastic.types import *
 
-__all__ = ["ErlangTermEncoder", "ErlangTermDecoder", "EncodingError"]
+__all__ = ["ErlangTermEncoder", "ErlangTermDecoder", "EncodingError",
+           "TupleView", "ListView"]
 
 class EncodingError(Exception):
     pass
 
+_TRUE = struct.pack(">BH", ATOM_EXT, 4) + b"true"
+_FALSE = struct.pack(">BH", ATOM_EXT, 5) + b"false"
+_NONE = struct.pack(">BH", ATOM_EXT, 4) + b"none"
+_NIL = struct.pack(">B", NIL_EXT)
+_SMALL_INTEGERS = [struct.pack(">BB", SMALL_INTEGER_EXT, i) for i in range(256)]
+
+class TermView(object):
+    """Tuple or list over an encoded buffer.  Elements are decoded when
+    indexed or iterated; offsets of the elements walked over so far are
+    kept, and elements before the one wanted are skipped, not decoded."""
+    def __init__(self, decoder, buf, offset, length):
+        self.decoder = decoder
+        self.buf = buf
+        self.length = length
+        self.offsets = [offset]
+
+    def offset(self, i):
+        offsets = self.offsets
+        while len(offsets) <= i:
+            offsets.append(self.decoder.skip_part(self.buf, offsets[-1]))
+        return offsets[i]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.materialize_type(self[j] for j in range(*i.indices(self.length)))
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("%s index out of range" % self.__class__.__name__)
+        return self.decoder.decode_view(self.buf, self.offset(i))
+
+    def __iter__(self):
+        decode_view = self.decoder.decode_view
+        for i in range(self.length):
+            yield decode_view(self.buf, self.offset(i))
+
+    def materialize(self):
+        """Fully decoded tuple or list"""
+        return self.materialize_type(
+            item.materialize() if isinstance(item, TermView) else item
+            for item in self)
+
+    def __eq__(self, other):
+        # Only a tuple or list can be equal, don't decode for anything else
+        if isinstance(other, TermView):
+            other = other.materialize()
+        elif not isinstance(other, (tuple, list)):
+            return NotImplemented
+        return self.materialize() == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.materialize())
+
+class TupleView(TermView):
+    materialize_type = tuple
+
+class ListView(TermView):
+    materialize_type = list
+
 class ErlangTermDecoder(object):
     def __init__(self):
         # Cache decode functions to avoid having to do a getattr
         self.decoders = {}
+        self.skippers = {}
         for k in self.__class__.__dict__:
             v = getattr(self, k)
             if callable(v) and k.startswith('decode_'):
                 try: self.decoders[int(k.split('_')[1])] = v
                 except: pass
+            elif callable(v) and k.startswith('skip_'):
+                try: self.skippers[int(k.split('_')[1])] = v
+                except: pass
 
-    def decode(self, buf, offset=0):
+    def decode(self, buf, offset=0, lazy=False):
+        """Decode a term.  With lazy=True tuples and lists are returned as
+        TupleView and ListView over buf."""
         if six.PY2 and isinstance(buf, basestring):
             buf = bytearray(buf)
         version = buf[offset]
         if version != FORMAT_VERSION:
             raise EncodingError("Bad version number. Expected %d found %d" % (FORMAT_VERSION, version))
+        if lazy:
+            return self.decode_view(buf, offset+1)
         return self.decode_part(buf, offset+1)[0]
 
     def decode_part(self, buf, offset=0):
         return self.decoders[buf[offset]](buf, offset+1)
 
+    def decode_view(self, buf, offset=0):
+        tag = buf[offset]
+        if tag == SMALL_TUPLE_EXT:
+            return TupleView(self, buf, offset+2, buf[offset+1])
+        elif tag == LARGE_TUPLE_EXT:
+            arity = struct.unpack(">L", buf[offset+1:offset+5])[0]
+            return TupleView(self, buf, offset+5, arity)
+        elif tag == LIST_EXT:
+            length = struct.unpack(">L", buf[offset+1:offset+5])[0]
+            return ListView(self, buf, offset+5, length)
+        elif tag == COMPRESSED:
+            buf = zlib.decompress(buf[offset+5:])
+            return self.decode_view(buf, 0)
+        return self.decode_part(buf, offset)[0]
+
+    def skip_part(self, buf, offset):
+        """Offset just past the term at offset, nothing is decoded"""
+        return self.skippers[buf[offset]](buf, offset+1)
+
+    def skip_97(self, buf, offset):
+        """SMALL_INTEGER_EXT"""
+        return offset+1
+
+    def skip_98(self, buf, offset):
+        """INTEGER_EXT"""
+        return offset+4
+
+    def skip_99(self, buf, offset):
+        """FLOAT_EXT"""
+        return offset+31
+
+    def skip_70(self, buf, offset):
+        """NEW_FLOAT_EXT"""
+        return offset+8
+
+    def skip_100(self, buf, offset):
+        """ATOM_EXT"""
+        return offset+2+struct.unpack(">H", buf[offset:offset+2])[0]
+
+    skip_107 = skip_100 # STRING_EXT
+
+    def skip_115(self, buf, offset):
+        """SMALL_ATOM_EXT"""
+        return offset+1+buf[offset]
+
+    def skip_104(self, buf, offset):
+        """SMALL_TUPLE_EXT"""
+        arity = buf[offset]
+        offset += 1
+        for i in range(arity):
+            offset = self.skip_part(buf, offset)
+        return offset
+
+    def skip_105(self, buf, offset):
+        """LARGE_TUPLE_EXT"""
+        arity = struct.unpack(">L", buf[offset:offset+4])[0]
+        offset += 4
+        for i in range(arity):
+            offset = self.skip_part(buf, offset)
+        return offset
+
+    def skip_106(self, buf, offset):
+        """NIL_EXT"""
+        return offset
+
+    def skip_108(self, buf, offset):
+        """LIST_EXT"""
+        length = struct.unpack(">L", buf[offset:offset+4])[0]
+        offset += 4
+        for i in range(length):
+            offset = self.skip_part(buf, offset)
+        return self.skip_part(buf, offset) # tail
+
+    def skip_109(self, buf, offset):
+        """BINARY_EXT"""
+        return offset+4+struct.unpack(">L", buf[offset:offset+4])[0]
+
+    def skip_110(self, buf, offset):
+        """SMALL_BIG_EXT"""
+        return offset+2+buf[offset]
+
+    def skip_111(self, buf, offset):
+        """LARGE_BIG_EXT"""
+        return offset+5+struct.unpack(">L", buf[offset:offset+4])[0]
+
+    def skip_101(self, buf, offset):
+        """REFERENCE_EXT"""
+        return self.skip_part(buf, offset)+5
+
+    def skip_114(self, buf, offset):
+        """NEW_REFERENCE_EXT"""
+        id_len = struct.unpack(">H", buf[offset:offset+2])[0]
+        return self.skip_part(buf, offset+2)+1+4*id_len
+
+    def skip_102(self, buf, offset):
+        """PORT_EXT"""
+        return self.skip_part(buf, offset)+5
+
+    def skip_103(self, buf, offset):
+        """PID_EXT"""
+        return self.skip_part(buf, offset)+9
+
+    def skip_113(self, buf, offset):
+        """EXPORT_EXT"""
+        for i in range(3):
+            offset = self.skip_part(buf, offset)
+        return offset
+
+    def skip_80(self, buf, offset):
+        """Compressed term"""
+        d = zlib.decompressobj()
+        d.decompress(bytes(buf[offset+4:]))
+        return len(buf) - len(d.unused_data)
+
     def decode_97(self, buf, offset):
         """SMALL_INTEGER_EXT"""
         return buf[offset], offset+1
@@ -233,6 +425,31 @@ class ErlangTermEncoder(object):
         self.encoding = encoding
         self.unicode_type = unicode_type
 
+        # Exact type -> encode function, see encode_part
+        self.encoders = {
+            bool: self.encode_bool,
+            type(None): self.encode_none,
+            float: self.encode_float,
+            Atom: self.encode_atom,
+            six.text_type: self.encode_text,
+            six.binary_type: self.encode_binary,
+            tuple: self.encode_tuple,
+            list: self.encode_list,
+            Reference: self.encode_reference,
+            Port: self.encode_port,
+            PID: self.encode_pid,
+            Export: self.encode_export,
+        }
+        for t in six.integer_types:
+            self.encoders[t] = self.encode_int
+        self.subclass_encoders = {}
+
+    def register(self, type_, encoder_fn):
+        """Register encoder_fn(encoder, obj) for objects of type_ and its
+        subclasses.  It returns a list of byte strings like encode_part."""
+        self.encoders[type_] = functools.partial(encoder_fn, self)
+        self.subclass_encoders.clear()
+
     def encode(self, obj, compressed=False):
         # import sys
         # import pprint
@@ -249,80 +466,115 @@ class ErlangTermEncoder(object):
             cbuf = zlib.compress(ubuf, compressed)
             if len(cbuf) < len(ubuf):
                 usize = struct.pack(">L", len(ubuf))
-                ubuf = "".join([COMPRESSED, usize, cbuf])
+                ubuf = b"".join([struct.pack("B", COMPRESSED), usize, cbuf])
         return struct.pack("B", FORMAT_VERSION) + ubuf
 
     def encode_part(self, obj):
-        if obj is False:
-            return [struct.pack(">BH", ATOM_EXT, 5) + b"false"]
-        elif obj is True:
-            return [struct.pack(">BH", ATOM_EXT, 4) + b"true"]
-        elif obj is None:
-            return [struct.pack(">BH", ATOM_EXT, 4) + b"none"]
-        elif isinstance(obj, int):
-            if 0 <= obj <= 255:
-                return [struct.pack(">BB", SMALL_INTEGER_EXT, obj)]
-            elif -2147483648 <= obj <= 2147483647:
-                return [struct.pack(">Bl", INTEGER_EXT, obj)]
-            else:
-                sign = obj < 0
-                obj = abs(obj)
-
-                big_buf = []
-                while obj > 0:
-                    big_buf.append(obj & 0xff)
-                    obj >>= 8
-
-                if len(big_buf) < 256:
-                    return [struct.pack(">BBB", SMALL_BIG_EXT, len(big_buf), sign), big_buf]
-                else:
-                    return [struct.pack(">BLB", LARGE_BIG_EXT, len(big_buf), sign), big_buf]
-        elif isinstance(obj, float):
-            floatstr = ("%.20e" % obj).encode('ascii')
-            return [struct.pack(">B", FLOAT_EXT), floatstr, b"\x00"*(31-len(floatstr))]
-        elif isinstance(obj, Atom):
-            st = obj.encode('latin-1')
-            return [struct.pack(">BH", ATOM_EXT, len(st)), st]
-        elif isinstance(obj, str):
-            st = obj.encode('utf-8')
-            return [struct.pack(">BL", BINARY_EXT, len(st)), st]
-        elif isinstance(obj, bytes):
-            return [struct.pack(">BL", BINARY_EXT, len(obj)), obj]
-        elif isinstance(obj, tuple):
-            n = len(obj)
-            if n < 256:
-                buf = [struct.pack('BB', SMALL_TUPLE_EXT, n)]
+        try:
+            encoder = self.encoders[obj.__class__]
+        except KeyError:
+            encoder = self.find_encoder(obj.__class__)
+        return encoder(obj)
+
+    def find_encoder(self, cls):
+        """Encoder of the nearest registered base class, cached per class"""
+        try:
+            return self.subclass_encoders[cls]
+        except KeyError:
+            pass
+        encoder = self.encode_unknown
+        for base in getattr(cls, '__mro__', ())[1:]:
+            if base in self.encoders:
+                encoder = self.encoders[base]
+                break
+        self.subclass_encoders[cls] = encoder
+        return encoder
+
+    def encode_unknown(self, obj):
+        raise NotImplementedError("Unable to serialize %r" % obj)
+
+    def encode_bool(self, obj):
+        if obj:
+            return [_TRUE]
+        return [_FALSE]
+
+    def encode_none(self, obj):
+        return [_NONE]
+
+    def encode_int(self, obj):
+        if 0 <= obj <= 255:
+            return [_SMALL_INTEGERS[obj]]
+        elif -2147483648 <= obj <= 2147483647:
+            return [struct.pack(">Bl", INTEGER_EXT, obj)]
+        else:
+            sign = obj < 0
+            obj = abs(obj)
+
+            big_buf = bytearray()
+            while obj > 0:
+                big_buf.append(obj & 0xff)
+                obj >>= 8
+
+            if len(big_buf) < 256:
+                return [struct.pack(">BBB", SMALL_BIG_EXT, len(big_buf), sign), bytes(big_buf)]
             else:
-                buf = [struct.pack('>BL', LARGE_TUPLE_EXT, n)]
-            for item in obj:
-                buf += self.encode_part(item)
-            return buf
-        elif obj == []:
-            return [struct.pack(">B", NIL_EXT)]
-        elif isinstance(obj, list):
-            buf = [struct.pack(">BL", LIST_EXT, len(obj))]
-            for item in obj:
-                buf += self.encode_part(item)
-            buf.append(struct.pack(">B", NIL_EXT)) # list tail - no such thing in Python
-            return buf
-        elif isinstance(obj, Reference):
-            return [
-                struct.pack(">BHBH", NEW_REFERENCE_EXT, len(obj.ref_id),
-                            ATOM_EXT, len(obj.node)), obj.node.encode('latin-1'),
-                struct.pack("B", obj.creation),
-                struct.pack(">%dL" % len(obj.ref_id), *obj.ref_id)]
-        elif isinstance(obj, Port):
-            return [
-                struct.pack(">BBH", PORT_EXT, ATOM_EXT, len(obj.node)),
-                obj.node.encode('latin-1'), struct.pack(">LB", obj.port_id, obj.creation)]
-        elif isinstance(obj, PID):
-           return [
-                struct.pack(">BBH", PID, ATOM_EXT, len(obj.node)), obj.node.encode('latin-1'),
-                struct.pack(">LLB", obj.pid_id, obj.serial, obj.creation)]
-        elif isinstance(obj, Export):
-            return [
-                struct.pack(">BBH", EXPORT_EXT, ATOM_EXT, len(obj.module)), obj.module.encode('latin-1'),
-                struct.pack(">BH", ATOM_EXT, len(obj.function)), obj.function.encode('latin-1'),
-                struct.pack(">BB", SMALL_INTEGER_EXT, obj.arity)]
+                return [struct.pack(">BLB", LARGE_BIG_EXT, len(big_buf), sign), bytes(big_buf)]
+
+    def encode_float(self, obj):
+        floatstr = ("%.20e" % obj).encode('ascii')
+        return [struct.pack(">B", FLOAT_EXT), floatstr, b"\x00"*(31-len(floatstr))]
+
+    def encode_atom(self, obj):
+        st = obj.encode('latin-1')
+        return [struct.pack(">BH", ATOM_EXT, len(st)), st]
+
+    def encode_text(self, obj):
+        st = obj.encode('utf-8')
+        return [struct.pack(">BL", BINARY_EXT, len(st)), st]
+
+    def encode_binary(self, obj):
+        return [struct.pack(">BL", BINARY_EXT, len(obj)), obj]
+
+    def encode_tuple(self, obj):
+        n = len(obj)
+        if n < 256:
+            buf = [struct.pack('BB', SMALL_TUPLE_EXT, n)]
         else:
-            raise NotImplementedError("Unable to serialize %r" % obj)
+            buf = [struct.pack('>BL', LARGE_TUPLE_EXT, n)]
+        encode_part = self.encode_part
+        for item in obj:
+            buf.extend(encode_part(item))
+        return buf
+
+    def encode_list(self, obj):
+        if not obj:
+            return [_NIL]
+        buf = [struct.pack(">BL", LIST_EXT, len(obj))]
+        encode_part = self.encode_part
+        for item in obj:
+            buf.extend(encode_part(item))
+        buf.append(_NIL) # list tail - no such thing in Python
+        return buf
+
+    def encode_reference(self, obj):
+        return [
+            struct.pack(">BHBH", NEW_REFERENCE_EXT, len(obj.ref_id),
+                        ATOM_EXT, len(obj.node)), obj.node.encode('latin-1'),
+            struct.pack("B", obj.creation),
+            struct.pack(">%dL" % len(obj.ref_id), *obj.ref_id)]
+
+    def encode_port(self, obj):
+        return [
+            struct.pack(">BBH", PORT_EXT, ATOM_EXT, len(obj.node)),
+            obj.node.encode('latin-1'), struct.pack(">LB", obj.port_id, obj.creation)]
+
+    def encode_pid(self, obj):
+        return [
+            struct.pack(">BBH", PID_EXT, ATOM_EXT, len(obj.node)), obj.node.encode('latin-1'),
+            struct.pack(">LLB", obj.pid_id, obj.serial, obj.creation)]
+
+    def encode_export(self, obj):
+        return [
+            struct.pack(">BBH", EXPORT_EXT, ATOM_EXT, len(obj.module)), obj.module.encode('latin-1'),
+            struct.pack(">BH", ATOM_EXT, len(obj.function)), obj.function.encode('latin-1'),
+            struct.pack(">BB", SMALL_INTEGER_EXT, obj.arity)]
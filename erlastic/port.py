@@ -0,0 +1,151 @@
+# Copyright (c) 2009-2013 Samuel Stauffer <samuel@descolada.com>
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of Samuel Stauffer nor the names of its contributors
+#	 may be used to endorse or promote products derived from this software
+#	 without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Erlang port driver for {packet, 4} framed terms on file descriptors"""
+
+import errno
+import os
+import struct
+
+from erlastic.codec import ErlangTermDecoder, ErlangTermEncoder
+
+__all__ = ["PortDriver", "FLUSH_EACH", "FLUSH_BATCH", "FLUSH_MANUAL"]
+
+FLUSH_EACH = "each"      # write every reply immediately
+FLUSH_BATCH = "batch"    # write replies before waiting for more input
+FLUSH_MANUAL = "manual"  # write when flush_size is exceeded or on flush()
+
+class PortDriver(object):
+    """Reads frames with large reads and parses them in the buffer; a
+    single read usually yields a whole batch of messages.  Replies are
+    collected into one output buffer and written according to the flush
+    policy.
+    """
+    def __init__(self, infd=0, outfd=1, read_size=65536, flush=FLUSH_BATCH,
+                 flush_size=65536, decoder=None, encoder=None):
+        if flush not in (FLUSH_EACH, FLUSH_BATCH, FLUSH_MANUAL):
+            raise ValueError("Unknown flush policy %r" % flush)
+        self.infd = infd
+        self.outfd = outfd
+        self.read_size = read_size
+        self.flush_policy = flush
+        self.flush_size = flush_size
+        self.decoder = decoder or ErlangTermDecoder()
+        self.encoder = encoder or ErlangTermEncoder()
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.eof = False
+
+    def fill(self):
+        """Read more input, return False on end of file"""
+        while True:
+            try:
+                data = os.read(self.infd, self.read_size)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            break
+        if not data:
+            self.eof = True
+            return False
+        self.inbuf += data
+        return True
+
+    def frames(self):
+        """Split complete frames off the input buffer"""
+        buf = self.inbuf
+        frames = []
+        pos = 0
+        end = len(buf)
+        while end - pos >= 4:
+            (length,) = struct.unpack_from(">L", buf, pos)
+            if end - pos - 4 < length:
+                break
+            frames.append(bytes(buf[pos+4:pos+4+length]))
+            pos += 4 + length
+        if pos:
+            del buf[:pos]
+        return frames
+
+    def receive_batch(self):
+        """Return the next batch of decoded terms, None at end of input"""
+        while True:
+            frames = self.frames()
+            if frames:
+                return [self.decoder.decode(frame) for frame in frames]
+            if self.flush_policy == FLUSH_BATCH:
+                self.flush()
+            if not self.fill():
+                if self.inbuf:
+                    raise EOFError("Truncated frame at end of input (%d bytes)" % len(self.inbuf))
+                return None
+
+    def batches(self):
+        while True:
+            batch = self.receive_batch()
+            if batch is None:
+                self.flush()
+                return
+            yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            for term in batch:
+                yield term
+
+    def send(self, term):
+        data = self.encoder.encode(term)
+        self.outbuf += struct.pack(">L", len(data))
+        self.outbuf += data
+        if self.flush_policy == FLUSH_EACH or len(self.outbuf) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        view = memoryview(self.outbuf)
+        sent = 0
+        try:
+            while sent < len(view):
+                try:
+                    sent += os.write(self.outfd, view[sent:])
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+        finally:
+            view.release()
+            del self.outbuf[:sent]
+
+    def serve(self, handler):
+        """Call handler for each received term and send back the replies
+        it returns; None means no reply."""
+        for batch in self.batches():
+            for term in batch:
+                reply = handler(term)
+                if reply is not None:
+                    self.send(reply)
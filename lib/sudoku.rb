@@ -98,16 +98,69 @@ class Cell
   alias eql? ==
 end
 
+# Per technique counters collected when profiling is enabled
+ProfileEntry = Struct.new(:calls, :hits, :time, :solved, :removed)
+
 class Solver
-  attr_reader :grid, :rows, :columns, :boxes, :candidates
+  attr_reader :grid, :rows, :columns, :boxes, :candidates, :profile
+
+  # No log output or grid dumps when set
+  attr_accessor :quiet
+
+  # Techniques tried by step, simplest first
+  FINDERS = [
+    :find_singles_simple,
+    :find_singles,
+    :find_naked_pairs,
+    :find_naked_triples,
+    :find_hidden_pairs,
+    :find_hidden_triples,
+    :find_naked_quads,
+    :find_hidden_quads,
+    :find_pointing_pairs,
+    :find_boxline_reductions,
+    :find_xwings,
+    :find_ywings,
+    :find_xyzwings
+  ]
 
   def initialize(str)
     @grid = string_to_grid(str)
     @candidates = []
     @trace = nil
+    @profile = nil
+    @quiet = false
     init
   end
 
+  def enable_profile(flag = true)
+    if flag
+      @profile ||= Hash.new { |h, k| h[k] = ProfileEntry.new(0, 0, 0.0, 0, 0) }
+    else
+      @profile = nil
+    end
+  end
+
+  def profiling?
+    !@profile.nil?
+  end
+
+  def run_finder(finder)
+    return send(finder) if @profile.nil?
+
+    t0 = Process.clock_gettime(Process::CLOCK_MONOTONIC)
+    solved, removed = send(finder)
+    entry = @profile[finder]
+    entry.time += Process.clock_gettime(Process::CLOCK_MONOTONIC) - t0
+    entry.calls += 1
+    if solved.length > 0 or removed.length > 0
+      entry.hits += 1
+      entry.solved += solved.length
+      entry.removed += removed.length
+    end
+    [solved, removed]
+  end
+
   def init_solved
     @solved = []
     @grid.each do |_pos, cell|
@@ -150,6 +203,7 @@ class Solver
   end
 
   def log(item, text, asdf=[])
+    return if @quiet
     puts "#{item} #{text}: #{asdf.length} candidates"
   end
 
@@ -216,27 +270,11 @@ class Solver
   end
 
   def step
-    finders = [
-      proc { find_singles_simple },
-      proc { find_singles },
-      proc { find_naked_pairs },
-      proc { find_naked_triples },
-      proc { find_hidden_pairs },
-      proc { find_hidden_triples },
-      proc { find_naked_quads },
-      proc { find_hidden_quads },
-      proc { find_pointing_pairs },
-      proc { find_boxline_reductions },
-      proc { find_xwings },
-      proc { find_ywings },
-      proc { find_xyzwings }
-    ]
-    
     solved = []
     removed = []
 
-    finders.each do |finder|
-      solved, removed = finder.call
+    FINDERS.each do |finder|
+      solved, removed = run_finder(finder)
       if solved.length > 0 or removed.length > 0
         break
       end
@@ -245,40 +283,42 @@ class Solver
   end
 
   def solve_singles
-    finders = [
-      proc { find_singles_simple },
-      proc { find_singles },
-    ]
+    finders = [:find_singles_simple, :find_singles]
 
     solved = []
     removed = []
     finders.each do |finder|
-      nsolved, nremoved = finder.call
+      nsolved, nremoved = run_finder(finder)
       solved |= nsolved
       removed |= nremoved
     end
     [solved, removed]
   end
 
+  # Returns the number of steps that made progress
   def solve
     log(:start, 'Start solving')
+    steps = 0
 
     loop do
       solved, removed = step
+      progress = (solved.length > 0 or removed.length > 0)
+      steps += 1 if progress
       log(:progress, "solved cells", solved) if solved.length > 0
       log(:progress, "removed", removed) if removed.length > 0
 
       if self.solved?
         log(:done, "Solved")
-        dump_grid
+        dump_grid unless @quiet
         break
       end
-      next if solved.length > 0 or removed.length > 0
+      next if progress
 
       log(:no_progress, "No progress", @candidates)
-      dump_candidates
+      dump_candidates unless @quiet
       break
     end
+    steps
   end
 
   # To be called with solved cells
@@ -733,7 +773,7 @@ class Solver
           # puts "	     #{anums} - #{bnums} - #{hnums}"
           @candidates.select { |cell|
             cell.value == z and a.sees?(cell.pos) and b.sees?(cell.pos)
-          }.uniq(&:pos).each { |cell| puts "   #{cell} #{hinge} #{a} #{b}" }
+          }.uniq(&:pos).each { |cell| puts "   #{cell} #{hinge} #{a} #{b}" } unless @quiet
 
           found |= @candidates.select { |cell|
             cell.value == z and a.sees?(cell.pos) and b.sees?(cell.pos)
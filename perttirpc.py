@@ -16,23 +16,109 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import itertools
 import os
 import socket
 import struct
 import sys
+import threading
 
 from erlastic import ErlangTermDecoder, ErlangTermEncoder, Atom
+import shmring
+import sudokuboard
 
 def is_ok_reply(reply):
     return len(reply) == 2 and reply[0] == 'reply' and reply[1] == 'ok'
 
+class SessionError(Exception):
+    pass
+
+class RPCError(Exception):
+    """{error, {Type, Code, Class, Detail, Backtrace}} reply"""
+    pass
+
+class Session(object):
+    """Solver session on the service.  Calls carry the session handle, so
+    any number of sessions can share one connection."""
+    def __init__(self, conn, handle):
+        self.conn = conn
+        self.handle = handle
+
+    def call(self, function, *args, **kw):
+        reply = self.conn.call('sudoku', function, [self.handle] + list(args),
+                               **kw)
+        if isinstance(reply, Atom) and reply == 'unknown_session':
+            raise SessionError('Unknown or expired session %r' % self.handle)
+        return reply
+
+    def get_solved(self):
+        return self.call('get_solved')
+
+    def get_candidates(self):
+        return self.call('get_candidates')
+
+    def step(self, lazy=False):
+        return self.call('step', lazy=lazy)
+
+    def solve(self, lazy=False):
+        return self.call('solve', lazy=lazy)
+
+    def solve_singles(self):
+        return self.call('solve_singles')
+
+    def get_profile(self):
+        return self.call('get_profile')
+
+    def close(self):
+        self.call('close')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 class Connection(object):
     def __init__(self, socket):
         self.socket = socket
         self.decoder = ErlangTermDecoder()
         self.encoder = ErlangTermEncoder()
+        self.encoder.register(sudokuboard.Board, sudokuboard.encode_term)
+        self.lock = threading.Lock()
+        self.streaming = None
+        self.shm = None
+        self.shm_threshold = 0
+
+    def enable_shm(self, size=64 << 20, threshold=64 << 10, directory=None):
+        """Move frames of at least threshold bytes to a shared memory ring
+        of size bytes each way, see shmring.  Returns False and keeps
+        using the socket if the peer does not support it."""
+        channel = shmring.Channel.create(size, directory)
+        try:
+            reply = self.call('perttirpc', 'shm_attach',
+                              [channel.path, size, threshold])
+        except RPCError:
+            reply = None
+        finally:
+            channel.unlink()
+        if reply != 'ok':
+            channel.close()
+            return False
+        self.shm = channel
+        self.shm_threshold = threshold
+        return True
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        self.socket.close()
 
     def send_packet4(self, msg):
+        if self.shm is not None and len(msg) >= self.shm_threshold:
+            doorbell = self.shm.send(msg)
+            if doorbell is not None:
+                msg = doorbell
         msg = struct.pack('>L', len(msg)) + msg
         berp_len = 4 + len(msg)
         self.socket.sendall(msg)
@@ -40,7 +126,11 @@ class Connection(object):
     def recv_packet4(self):
         # print 'recv_packet4 0'
         data = self.socket.recv(4)
-        if data == '': raise IOError('Connection closed')
+        while 0 < len(data) < 4:
+            more = self.socket.recv(4 - len(data))
+            if not more: break
+            data += more
+        if len(data) < 4: raise IOError('Connection closed')
 
         # print 'recv_packet4 1', data
         msg_size, = struct.unpack('>L', data)
@@ -60,24 +150,108 @@ class Connection(object):
             msg.append(data)
             received += len(data)
         msg = b''.join(msg)
+        if self.shm is not None and msg[:1] == shmring.DOORBELL:
+            msg = self.shm.receive(msg)
+            msg_size = len(msg)
         # print 'recv_packet4 3', repr(msg), ord(msg[0])
         return (msg_size, msg)
 
-    def call(self, module, function, args=[]):
+    def call(self, module, function, args=[], lazy=False):
+        """With lazy=True tuples and lists in the reply are erlastic
+        TupleView and ListView objects, decoded only when accessed."""
         msg = self.encoder.encode((Atom('call'), Atom(module), Atom(function), args))
         # print "Send ", repr(msg)
-        self.send_packet4(msg)
-        size, data = self.recv_packet4()
-        msg = self.decoder.decode(data)
+        self.check_streaming()
+        with self.lock:
+            self.send_packet4(msg)
+            size, data = self.recv_packet4()
+        msg = self.decoder.decode(data, lazy=lazy)
+        if msg[0] == 'error':
+            raise RPCError(*msg[1])
         return msg[1]
 
+    def call_stream(self, module, function, args=[], lazy=False):
+        """Call a function that replies with {chunk, Items} frames ended
+        by {done, Count} and yield the items of each chunk.  Other calls
+        on the connection wait until the done frame has been read; from
+        the thread consuming the stream they raise RuntimeError."""
+        msg = self.encoder.encode((Atom('call'), Atom(module), Atom(function), args))
+        self.check_streaming()
+        with self.lock:
+            self.streaming = threading.current_thread()
+            try:
+                self.send_packet4(msg)
+                while True:
+                    size, data = self.recv_packet4()
+                    msg = self.decoder.decode(data, lazy=lazy)
+                    if msg[0] == 'error':
+                        raise RPCError(*msg[1])
+                    reply = msg[1]
+                    if reply[0] == 'done':
+                        return
+                    try:
+                        yield reply[1]
+                    except GeneratorExit:
+                        self.drain_stream()
+                        raise
+            finally:
+                self.streaming = None
+
+    def check_streaming(self):
+        # The lock is held until the stream ends, waiting for it in the
+        # consuming thread would never return
+        if self.streaming is threading.current_thread():
+            raise RuntimeError('Connection is streaming a reply to this thread')
+
+    def drain_stream(self):
+        while True:
+            size, data = self.recv_packet4()
+            msg = self.decoder.decode(data, lazy=True)
+            if msg[0] == 'error' or msg[1][0] == 'done':
+                return
+
+    def solve_many(self, grids, batch=1000, chunk=0, lazy=False):
+        """Solve an iterable of grids without sessions, yielding
+        (status, solution, steps) for each in order.  The grids are sent
+        in solve_many calls of at most batch grids; with chunk > 0 the
+        service streams each call's results in replies of at most chunk
+        results instead of one reply."""
+        grids = iter(grids)
+        while True:
+            part = list(itertools.islice(grids, batch))
+            if not part:
+                return
+            if chunk > 0:
+                for results in self.call_stream('sudoku', 'solve_many',
+                                                [part, chunk], lazy=lazy):
+                    for result in results:
+                        yield result
+            else:
+                for result in self.call('sudoku', 'solve_many', [part],
+                                        lazy=lazy):
+                    yield result
+
+    def open_session(self, grid):
+        reply = self.call('sudoku', 'init', [grid])
+        if len(reply) != 2 or reply[0] != 'ok':
+            raise SessionError('init failed: %r' % (reply,))
+        return Session(self, reply[1])
+
     def cast(self, module, function, args=[]):
         msg = self.encoder.encode((Atom('cast'), Atom(module), Atom(function), args))
-        self.send_packet4(msg)
+        self.check_streaming()
+        with self.lock:
+            self.send_packet4(msg)
 
     def info(self, command, options):
         msg = self.encoder.encode((Atom('info'), Atom(command), options))
-        self.send_packet4(msg)
+        self.check_streaming()
+        with self.lock:
+            self.send_packet4(msg)
+
+def default_socket_path():
+    user = os.getenv('USER')
+    return '/tmp/sudokusocket-' + user + os.sep + 'sudoku.sock'
 
 def connect_unix(path):
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Throughput of erlastic's Erlang port drivers: an echo worker is run as
+# a child process and fed framed terms through its stdin.
+#
+#   python portbench.py [-n MESSAGES] [--flush each|batch]
+#                       [--payload small|step]
+#
+# With the default small payload the time is dominated by framing and
+# I/O; step sized payloads show the share of term encoding and decoding.
+#
+from __future__ import print_function, division
+
+import argparse
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import erlastic
+from erlastic import Atom, PortDriver
+
+def step_reply(n):
+    # Shaped like a sudoku step reply
+    return (Atom('unsolved'), b'0' * 81,
+            [((n % 9 + 1, 1), 5)],
+            [((i % 9 + 1, i // 9 + 1), i % 9 + 1) for i in range(20)])
+
+def worker_generators():
+    mailbox, port = erlastic.port_connection()
+    for term in mailbox:
+        port.send((Atom('reply'), term))
+
+def worker_driver(flush):
+    driver = PortDriver(sys.stdin.fileno(), sys.stdout.fileno(), flush=flush)
+    driver.serve(lambda term: (Atom('reply'), term))
+
+PAYLOADS = {
+    'small': lambda: (Atom('step'), 1),
+    'step': lambda: step_reply(0),
+}
+
+def run(worker, messages, flush, payload):
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', worker,
+           '--flush', flush]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    frame = erlastic.encode(PAYLOADS[payload]())
+    frame = struct.pack('>L', len(frame)) + frame
+    chunk = frame * 256
+
+    def feed():
+        left = messages
+        while left > 0:
+            n = min(left, 256)
+            proc.stdin.write(chunk if n == 256 else frame * n)
+            left -= n
+        proc.stdin.close()
+
+    t0 = time.time()
+    writer = threading.Thread(target=feed)
+    writer.start()
+
+    replies = 0
+    reader = PortDriver(proc.stdout.fileno(), None)
+    while True:
+        frames = reader.frames()
+        replies += len(frames)
+        if not frames and not reader.fill():
+            break
+    elapsed = time.time() - t0
+
+    writer.join()
+    proc.wait()
+    if replies != messages:
+        raise RuntimeError('%s: %d replies to %d messages' % (worker, replies, messages))
+    return elapsed
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark erlastic port drivers')
+    parser.add_argument('-n', '--messages', type=int, default=100000)
+    parser.add_argument('--flush', choices=['each', 'batch'], default='batch')
+    parser.add_argument('--payload', choices=sorted(PAYLOADS), default='small')
+    parser.add_argument('--worker', choices=['generators', 'driver'])
+    args = parser.parse_args(argv)
+
+    if args.worker == 'generators':
+        worker_generators()
+        return
+    elif args.worker == 'driver':
+        worker_driver(args.flush)
+        return
+
+    for worker in ['generators', 'driver']:
+        elapsed = run(worker, args.messages, args.flush, args.payload)
+        print('%-10s %8d messages %8.3f s %10.0f msg/s' %
+              (worker, args.messages, elapsed, args.messages / elapsed))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,228 @@
+#
+# Shared memory ring buffer transport for perttirpc connections.
+#
+# The client creates a file holding two rings (client to server and
+# server to client), maps it and asks the peer to map it too with
+# {call, perttirpc, shm_attach, [Path, Size, Threshold]} over the
+# socket.  After the reply, frames of at least Threshold bytes are
+# copied into the ring and the socket only carries a doorbell frame: a
+# zero byte (BERT frames start with 131), the frame's position in the
+# ring and its length.  Smaller frames, and frames that do not fit in
+# the ring right now, still go over the socket.  A peer that does not
+# know shm_attach replies with an error and the socket stays as is.
+# sudokusvc.rb maps the rings with shmring.rb.
+#
+#   python shmring.py [-n CALLS] [--payload BYTES] [--ring BYTES]
+#
+# benchmarks echo calls to a stand-in peer with and without the ring.
+#
+from __future__ import print_function, division
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+from erlastic import Atom
+
+DOORBELL = b'\x00'
+DOORBELL_FMT = '>QL'
+HEADER_SIZE = 64
+
+def shm_directory():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+class Ring(object):
+    """One direction: a header with the reader's position, then the data.
+    Positions count bytes written since the start and wrap modulo size."""
+    def __init__(self, mm, offset, size):
+        self.mm = mm
+        self.header = offset
+        self.data = offset + HEADER_SIZE
+        self.size = size
+
+    def read_pos(self):
+        return struct.unpack_from('<Q', self.mm, self.header)[0]
+
+    def set_read_pos(self, pos):
+        struct.pack_into('<Q', self.mm, self.header, pos)
+
+    def write(self, pos, data):
+        start = pos % self.size
+        first = min(len(data), self.size - start)
+        self.mm[self.data+start:self.data+start+first] = data[:first]
+        if first < len(data):
+            self.mm[self.data:self.data+len(data)-first] = data[first:]
+
+    def read(self, pos, length):
+        start = pos % self.size
+        first = min(length, self.size - start)
+        data = self.mm[self.data+start:self.data+start+first]
+        if first < length:
+            data += self.mm[self.data:self.data+length-first]
+        return data
+
+class Channel(object):
+    def __init__(self, path, size, client, create=False):
+        self.path = path
+        self.size = size
+        total = 2 * (HEADER_SIZE + size)
+        if create:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            os.ftruncate(fd, total)
+        else:
+            fd = os.open(path, os.O_RDWR)
+            if os.fstat(fd).st_size != total:
+                os.close(fd)
+                raise IOError('%s: size does not match %d' % (path, size))
+        try:
+            self.mm = mmap.mmap(fd, total)
+        finally:
+            os.close(fd)
+
+        to_server = Ring(self.mm, 0, size)
+        to_client = Ring(self.mm, HEADER_SIZE + size, size)
+        if client:
+            self.tx, self.rx = to_server, to_client
+        else:
+            self.tx, self.rx = to_client, to_server
+        self.write_pos = 0
+
+    @classmethod
+    def create(cls, size, directory=None):
+        fd, path = tempfile.mkstemp(prefix='perttirpc-', suffix='.shm',
+                                    dir=directory or shm_directory())
+        os.close(fd)
+        os.unlink(path)
+        return cls(path, size, client=True, create=True)
+
+    @classmethod
+    def attach(cls, path, size):
+        return cls(path, size, client=False)
+
+    def unlink(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def send(self, frame):
+        """Copy frame into the ring, return the doorbell to send on the
+        socket or None if there is no room"""
+        used = self.write_pos - self.tx.read_pos()
+        if len(frame) > self.size - used:
+            return None
+        pos = self.write_pos
+        self.tx.write(pos, frame)
+        self.write_pos += len(frame)
+        return DOORBELL + struct.pack(DOORBELL_FMT, pos, len(frame))
+
+    def receive(self, doorbell):
+        pos, length = struct.unpack(DOORBELL_FMT, doorbell[1:])
+        frame = self.rx.read(pos, length)
+        self.rx.set_read_pos(pos + length)
+        return frame
+
+    def close(self):
+        self.mm.close()
+
+class EchoPeer(object):
+    """Stand-in for the sudoku service: serves shm_attach and
+    {call, echo, echo, [Term]} on a Unix socket."""
+    def __init__(self, path):
+        self.path = path
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+
+    def serve_forever(self):
+        while True:
+            sock, _ = self.server.accept()
+            self.serve(sock)
+
+    def serve(self, sock):
+        import perttirpc
+        conn = perttirpc.Connection(sock)
+        try:
+            while True:
+                size, data = conn.recv_packet4()
+                msg = conn.decoder.decode(data)
+                if msg[0] != 'call':
+                    continue
+                module, function, args = msg[1], msg[2], msg[3]
+                if (module, function) == ('perttirpc', 'shm_attach'):
+                    path, size, threshold = args
+                    channel = Channel.attach(path.decode('utf-8'), size)
+                    conn.send_packet4(conn.encoder.encode((Atom('reply'), Atom('ok'))))
+                    conn.shm, conn.shm_threshold = channel, threshold
+                    continue
+                elif (module, function) == ('echo', 'echo'):
+                    reply = (Atom('reply'), args[0])
+                else:
+                    reply = (Atom('error'), (Atom('server'), 2, b'NoSuchFunction',
+                                             b'no such function', []))
+                conn.send_packet4(conn.encoder.encode(reply))
+        except IOError:
+            pass
+        finally:
+            if conn.shm is not None:
+                conn.shm.close()
+            sock.close()
+
+def run_peer(path):
+    EchoPeer(path).serve_forever()
+
+def bench(path, calls, payload, ring_size):
+    import perttirpc
+    data = os.urandom(payload)
+    results = {}
+    for mode in ['socket', 'shm']:
+        conn = perttirpc.Connection(perttirpc.connect_unix(path))
+        if mode == 'shm' and not conn.enable_shm(ring_size):
+            raise RuntimeError('peer did not accept the shared memory ring')
+        t0 = time.time()
+        for _ in range(calls):
+            reply = conn.call('echo', 'echo', [data])
+            if len(reply) != payload:
+                raise RuntimeError('bad echo reply')
+        results[mode] = time.time() - t0
+        conn.close()
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the shared memory ring')
+    parser.add_argument('-n', '--calls', type=int, default=200)
+    parser.add_argument('--payload', type=int, default=4 << 20)
+    parser.add_argument('--ring', type=int, default=64 << 20)
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix='shmring-')
+    path = os.path.join(tmpdir, 'echo.sock')
+    peer = multiprocessing.Process(target=run_peer, args=(path,))
+    peer.daemon = True
+    peer.start()
+    try:
+        while not os.path.exists(path):
+            time.sleep(0.01)
+        results = bench(path, args.calls, args.payload, args.ring)
+    finally:
+        peer.terminate()
+        peer.join()
+        os.unlink(path)
+        os.rmdir(tmpdir)
+
+    mb = 2 * args.calls * args.payload / (1 << 20)
+    for mode in ['socket', 'shm']:
+        elapsed = results[mode]
+        print('%-7s %5d calls of %d bytes %8.3f s %8.1f MB/s' %
+              (mode, args.calls, args.payload, elapsed, mb / elapsed))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,114 @@
+# coding: iso-8859-1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+require 'fiddle'
+
+# Service side of the shared memory rings set up by perttirpc clients with
+# {call, perttirpc, shm_attach, [Path, Size, Threshold]}; shmring.py has
+# the client side and describes the layout.  Frames are read from the
+# client to server ring and written to the server to client ring.
+class ShmChannel
+  HEADER_SIZE = 64
+  DOORBELL = 0
+  DOORBELL_FORMAT = 'Q>L>'
+
+  PROT_READ = 1
+  PROT_WRITE = 2
+  MAP_SHARED = 1
+
+  LIBC = Fiddle.dlopen(nil)
+  MMAP = Fiddle::Function.new(LIBC['mmap'],
+                              [Fiddle::TYPE_VOIDP, Fiddle::TYPE_SIZE_T,
+                               Fiddle::TYPE_INT, Fiddle::TYPE_INT,
+                               Fiddle::TYPE_INT, Fiddle::TYPE_LONG],
+                              Fiddle::TYPE_VOIDP)
+  MUNMAP = Fiddle::Function.new(LIBC['munmap'],
+                                [Fiddle::TYPE_VOIDP, Fiddle::TYPE_SIZE_T],
+                                Fiddle::TYPE_INT)
+
+  attr_reader :size, :threshold
+
+  def initialize(path, size, threshold)
+    fail ArgumentError, "bad ring size #{size}" unless size > 0
+    total = 2 * (HEADER_SIZE + size)
+    File.open(path, File::RDWR) do |f|
+      fail ArgumentError, "#{path}: size does not match #{size}" unless f.size == total
+      addr = MMAP.call(nil, total, PROT_READ | PROT_WRITE, MAP_SHARED, f.fileno, 0)
+      fail SystemCallError.new("mmap #{path}", Fiddle.last_error) if addr.to_i == -1
+      @mem = Fiddle::Pointer.new(addr.to_i, total)
+    end
+    @total = total
+    @size = size
+    @threshold = threshold
+    @rx = 0
+    @tx = HEADER_SIZE + size
+    @write_pos = 0
+  end
+
+  def self.doorbell?(frame)
+    frame.getbyte(0) == DOORBELL
+  end
+
+  # Copy frame into the ring, return the doorbell to send on the socket
+  # or nil if there is no room
+  def send(frame)
+    length = frame.bytesize
+    used = @write_pos - read_pos(@tx)
+    return nil if length > @size - used
+
+    pos = @write_pos
+    write(@tx, pos, frame)
+    @write_pos += length
+    DOORBELL.chr + [pos, length].pack(DOORBELL_FORMAT)
+  end
+
+  def receive(doorbell)
+    pos, length = doorbell.byteslice(1, 12).unpack(DOORBELL_FORMAT)
+    frame = read(@rx, pos, length)
+    @mem[@rx, 8] = [pos + length].pack('Q<')
+    frame
+  end
+
+  def close
+    return if @mem.nil?
+    MUNMAP.call(@mem, @total)
+    @mem = nil
+  end
+
+  private
+
+  def read_pos(ring)
+    @mem[ring, 8].unpack('Q<')[0]
+  end
+
+  def write(ring, pos, data)
+    base = ring + HEADER_SIZE
+    start = pos % @size
+    first = [data.bytesize, @size - start].min
+    @mem[base + start, first] = data.byteslice(0, first)
+    @mem[base, data.bytesize - first] = data.byteslice(first..-1) if first < data.bytesize
+  end
+
+  def read(ring, pos, length)
+    base = ring + HEADER_SIZE
+    start = pos % @size
+    first = [length, @size - start].min
+    data = @mem[base + start, first]
+    data << @mem[base, length - first] if first < length
+    data
+  end
+end
@@ -17,184 +17,36 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 from __future__ import print_function, division
-import six
+import time
+startup_t0 = time.time()
 
 from PySide import QtCore, QtGui, QtUiTools
 
 import os
 import perttirpc
-import time
+import sys
 
-class SudokuGrid(QtGui.QWidget):
-    def __init__(self, *args, **kw):
-        super(SudokuGrid, self).__init__(*args, **kw)
-        self.cell_sz = 64
-        self.box_sz = 3 * self.cell_sz
-        self.grid_sz = 9 * self.cell_sz
-
-        self.num_sz = self.cell_sz // 3
-        self.num_font_sz = self.num_sz - 5
-
-        self.reset()
-
-    def reset(self):
-        self.solved = {}
-        self.candidates = {}
-
-        self.pixmap = QtGui.QPixmap(600, 600)
-        self.pixmap.fill(self, 0, 0)
-        painter = QtGui.QPainter(self.pixmap)
-        painter.initFrom(self)
-        self.paint(painter)
-        painter.end()
-        self.update()
-
-    def get_pixmap_painter(self):
-        painter = QtGui.QPainter(self.pixmap)
-        painter.initFrom(self)
-        return painter
-
-    def paint_grid(self, painter):
-        pen0 = QtGui.QPen()
-        pen1 = QtGui.QPen()
-        pen2 = QtGui.QPen()
-
-        pen0.setWidth(3)
-        pen1.setWidth(2)
-        pen2.setWidth(1)
-
-        painter.setPen(pen0)
-        painter.fillRect(QtCore.QRect(0, 0, self.grid_sz, self.grid_sz),
-                         QtCore.Qt.lightGray)
-        painter.drawRect(QtCore.QRect(0, 0, self.grid_sz, self.grid_sz))
-
-        for i in range(0, self.grid_sz + 1, self.cell_sz):
-            if i % self.box_sz == 0:
-                painter.setPen(pen1)
-            else:
-                painter.setPen(pen2)
-
-            painter.drawLine(i, 0, i, self.grid_sz)
-            painter.drawLine(0, i, self.grid_sz, i)
-
-    def candidate_rect(self, row, column, number):
-        num_sz = self.cell_sz // 3
-        x = (row - 1) * self.cell_sz
-        y = (column - 1) * self.cell_sz
-
-        offset = [2, 0, 1]		# 3, 1, 2
-        x += offset[number % 3] * num_sz
-        y += (number - 1) // 3 * num_sz
-
-        rect = QtCore.QRectF(x, y, num_sz, num_sz)
-        return rect
-
-    def paint_cell_candidate(self, row, column, number, painter):
-        # row		1..9
-        # column 	1..9
-
-        rect = self.candidate_rect(row, column, number)
-        painter.drawText(rect, QtCore.Qt.AlignCenter, "%d" % number)
-
-    def paint_cell_candidates(self, candidates, painter=None):
-        if painter is None:
-            painter = self.get_pixmap_painter()
-
-        painter.setFont(QtGui.QFont("Times", self.num_font_sz))
-
-        for (row, col), n in candidates:
-            self.paint_cell_candidate(row, col, n, painter)
-
-    def cell_rect(self, row, column):
-        # row		1..9
-        # column 	1..9
-        x = (row - 1) * self.cell_sz
-        y = (column - 1) * self.cell_sz
-
-        rect = QtCore.QRectF(x, y, self.cell_sz, self.cell_sz)
-        return rect
-
-    def update_solved(self, cells, color=None):
-        painter = self.get_pixmap_painter()
-
-        for (row, col), num in cells:
-            self.solved[row, col] = num
-        self.paint_solved(cells, painter, color)
-
-    def paint_solved(self, cells, painter=None, color=QtCore.Qt.black):
-        if painter is None:
-            painter = self.get_pixmap_painter()
-
-        font_size = 40
-        painter.setFont(QtGui.QFont("Times", font_size))
-        pen = QtGui.QPen()
-        pen.setColor(color)
-        painter.setPen(pen)
-        for (row, col), num in cells:
-            rect = self.cell_rect(row, col)
-            self.blank_rect(rect, 2, painter)
-            painter.drawText(rect, QtCore.Qt.AlignCenter, "%d" % num)
-
-    def paint(self, painter):
-        self.paint_grid(painter)
-        # self.paint_cands(painter)
-        self.paint_solved(((k, v) for k, v in six.iteritems(self.solved)),
-                          painter)
-
-    def paintEvent(self, event):
-        painter = QtGui.QPainter()
-        painter.begin(self)
-        painter.setClipRegion(event.region())
-        painter.drawPixmap(0, 0, self.pixmap)
-        painter.end()
-
-    def blank_rect(self, rect, width, painter, color=QtCore.Qt.lightGray):
-        rect = QtCore.QRect(rect.x() + width, rect.y() + width,
-                            rect.width() - 2 * width, rect.width() - 2 * width)
-        painter.fillRect(rect, color)
-
-    def border_rect(self, rect, width, painter, color=QtCore.Qt.lightGray):
-        pen = QtGui.QPen()
-        pen.setWidth(width)
-        pen.setColor(color)
-        painter.setPen(pen)
-
-        rect = QtCore.QRect(rect.x() + width, rect.y() + width,
-                            rect.width() - 2 * width, rect.width() - 2 * width)
-        painter.drawRect(rect)
-
-    def blank_cell(self, row, column, painter):
-        # row		1..9
-        # column 	1..9
-        self.blank_rect(self.cell_rect(row, column), 2, painter)
-
-    def blank_candidate(self, row, column, number, painter):
-        rect = self.candidate_rect(row, column, number)
-
-        dx = [-1, 1, 0]		# 3, 1, 2
-        dy = [1, 0, -1]
-        rect.translate(dx[number % 3], dy[(number - 1) // 3])
-        self.border_rect(rect, 1, painter, QtCore.Qt.red)
-
-    def eliminate(self, eliminated):
-        painter = self.get_pixmap_painter()
-        for (row, col), num in eliminated:
-            self.blank_candidate(row, col, num, painter)
-        self.update()
-
-    def mark_cell(self, row, column, painter):
-        pass
+from sudokugrid import SudokuGrid
 
-    def mark_candidate(self, row, column, number, painter):
-        pass
+DEFAULT_GRID = '610320000300400000058600000009503620000040000023801500000006750000004003000058014'
 
-    def unmark_cell(self, row, column):
-        pass
+class StartupTimer(object):
+    """Time since process start, printed when SUDOKU_STARTUP_TIMING is set."""
+    def __init__(self, t0, enabled=False):
+        self.t0 = t0
+        self.enabled = enabled
+        self.marks = {}
 
-    def unmark_candidate(self, row, column, number, painter):
-        pass
+    def mark(self, name):
+        if name in self.marks:
+            return
+        elapsed = time.time() - self.t0
+        self.marks[name] = elapsed
+        if self.enabled:
+            print('startup: %-16s %8.1f ms' % (name, elapsed * 1000),
+                  file=sys.stderr)
 
-def load_ui(filename, parent=None):
+def load_ui_file(filename, parent=None):
     loader = QtUiTools.QUiLoader()
     loader.registerCustomWidget(SudokuGrid)
     uifile = QtCore.QFile(filename)
@@ -203,85 +55,236 @@ def load_ui(filename, parent=None):
     uifile.close()
     return ui
 
+def load_ui(filename, parent=None):
+    # Prefer the precompiled module (rake ui) unless it is out of date
+    try:
+        import sudoku_ui
+        compiled = os.path.splitext(sudoku_ui.__file__)[0] + '.py'
+        if os.path.getmtime(compiled) < os.path.getmtime(filename):
+            raise ImportError('%s is older than %s' % (compiled, filename))
+    except (ImportError, OSError):
+        return load_ui_file(filename, parent)
+
+    ui = QtGui.QMainWindow(parent)
+    sudoku_ui.Ui_MainWindow().setupUi(ui)
+    return ui
+
 def asdf(selffi):
     def cb(*args):
         print("Here")
     return cb
 
+class RpcConnector(QtCore.QThread):
+    """Connect to the solver service and fetch the initial grid without
+    blocking the GUI.  Retries with exponential backoff until stopped."""
+    connected = QtCore.Signal(object, object, object)
+    retrying = QtCore.Signal(str, float)
+
+    min_delay = 0.1
+    max_delay = 5.0
+
+    def __init__(self, path, grid, rpc=None, parent=None):
+        super(RpcConnector, self).__init__(parent)
+        self.path = path
+        self.grid = grid
+        self.rpc = rpc
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def fetch_grid(self, rpc):
+        rpc.call('sudoku', 'init', self.grid)
+        solved = rpc.call('sudoku', 'get_solved')
+        candidates = rpc.call('sudoku', 'get_candidates')
+        return solved, candidates
+
+    def run(self):
+        delay = self.min_delay
+        rpc = self.rpc
+
+        while not self.stopped:
+            try:
+                if rpc is None:
+                    rpc = perttirpc.Connection(perttirpc.connect_unix(self.path))
+                solved, candidates = self.fetch_grid(rpc)
+            except Exception as e:
+                # Any failure, not only a refused connection, starts over
+                # on a new connection
+                if rpc is not None:
+                    rpc.close()
+                rpc = None
+                self.retrying.emit(str(e), delay)
+                time.sleep(delay)
+                delay = min(2 * delay, self.max_delay)
+                continue
+
+            self.connected.emit(rpc, solved, candidates)
+            return
+
 class SudokuApp(QtGui.QApplication):
-    def __init__(self, args):
+    def __init__(self, args, timer=None):
         super(SudokuApp, self).__init__(args)
+        self.timer = timer or StartupTimer(startup_t0)
+        self.timer.mark('qt_init')
+
         self.ui = load_ui("sudoku.ui")
+        self.timer.mark('ui_loaded')
 
         self.grid = self.ui.findChild(SudokuGrid, "paint_area")
+        self.grid.installEventFilter(self)
         self.ui.setFixedSize(610, 840)
         self.solved = False
+        self.status_bar = self.ui.findChild(QtGui.QStatusBar, "statusbar")
 
         self.step_button = self.ui.findChild(QtGui.QPushButton, "step_button")
         self.step_button.clicked.connect(self.on_step)
+        self.step_button.setEnabled(False)
+
+        self.undo_button = self.ui.findChild(QtGui.QPushButton, "undo_button")
+        self.undo_button.clicked.connect(self.on_undo)
+        self.redo_button = self.ui.findChild(QtGui.QPushButton, "redo_button")
+        self.redo_button.clicked.connect(self.on_redo)
+        self.seek_slider = self.ui.findChild(QtGui.QSlider, "seek_slider")
+        self.seek_slider.valueChanged.connect(self.on_seek)
 
         button = self.ui.findChild(QtGui.QPushButton, "reset_button")
         button.clicked.connect(self.on_reset)
 
-        self.connect_rpc()
+        self.rpc = None
+        self.connector = None
+        self.update_buttons()
+        self.aboutToQuit.connect(self.on_quit)
         # self.rpc = bertrpc.Service('localhost', 7777)
         # self.rpc.request('call').sudoku.init('610320000300400000058600000009503620000040000023801500000006750000004003000058014')
 
-    def connect_rpc(self):
-        user = os.getenv('USER')
-        self.rpc_sock = perttirpc.connect_unix('/tmp/sudokusocket-' + user + os.sep + 'sudoku.sock')
-        self.rpc = perttirpc.Connection(self.rpc_sock)
+    def eventFilter(self, obj, event):
+        if obj is self.grid and event.type() == QtCore.QEvent.Paint:
+            self.timer.mark('first_paint')
+            self.grid.removeEventFilter(self)
+        return False
 
+    def connect_rpc(self):
         self.init_grid()
         # reply = self.rpc.call('sudoku', 'solve', [])
         # reply = self.rpc.call('sudoku', 'solve_singles')
         # print reply
         # sys.exit(1)
 
-    def init_grid(self, grid='610320000300400000058600000009503620000040000023801500000006750000004003000058014'):
-        reply = self.rpc.call('sudoku', 'init', grid)
-        if not perttirpc.is_ok_reply(reply):
-            # Display error
-            pass
+    def init_grid(self, grid=DEFAULT_GRID):
+        if self.connector is not None:
+            self.connector.stop()
+
+        self.status_bar.showMessage('Connecting to the solver service...')
+        self.connector = RpcConnector(perttirpc.default_socket_path(), grid,
+                                      self.rpc, self)
+        self.update_buttons()
+        self.connector.connected.connect(self.on_connected)
+        self.connector.retrying.connect(self.on_retrying)
+        self.connector.start()
+
+    def on_retrying(self, error, delay):
+        self.status_bar.showMessage('Solver service unavailable (%s), '
+                                    'retrying in %.1f s' % (error, delay))
+
+    def on_connected(self, rpc, solved, candidates):
+        if self.sender() is not self.connector:
+            return
+        self.timer.mark('grid_loaded')
+        self.connector = None
+        self.rpc = rpc
 
-        reply = self.rpc.call('sudoku', 'get_solved')
-        # print reply
-        self.grid.update_solved(reply)
+        self.solved = False
+        self.grid.load(solved, candidates)
+        self.grid.update()
+        self.status_bar.clearMessage()
+        self.update_buttons()
 
-        reply = self.rpc.call('sudoku', 'get_candidates')
-        # print reply
-        self.grid.paint_cell_candidates(reply)
+    def on_connection_lost(self):
+        self.rpc = None
+        self.grid.reset()
+        self.init_grid()
+
+    def on_quit(self):
+        if self.connector is not None:
+            self.connector.stop()
+            self.connector.wait()
 
     def on_reset(self):
         self.grid.reset()
         self.init_grid()
-        self.step_button.setEnabled(True)
+
+    def update_buttons(self):
+        board = self.grid.board
+        idle = self.connector is None
+        connected = idle and self.rpc is not None
+        self.step_button.setEnabled(idle and board.can_redo() or
+                                    connected and not self.solved)
+        self.undo_button.setEnabled(idle and board.can_undo())
+        self.redo_button.setEnabled(idle and board.can_redo())
+        # Follows the history without calling on_seek back
+        self.seek_slider.blockSignals(True)
+        self.seek_slider.setMaximum(len(board.history))
+        self.seek_slider.setValue(board.position)
+        self.seek_slider.blockSignals(False)
+        self.seek_slider.setEnabled(idle and len(board.history) > 0)
 
     def on_step(self):
-        reply = self.rpc.call('sudoku', 'step')
+        # Replay recorded steps before asking the service for new ones
+        if self.grid.board.can_redo():
+            self.on_redo()
+            return
+
+        try:
+            reply = self.rpc.call('sudoku', 'step')
+        except (IOError, OSError):
+            self.on_connection_lost()
+            return
+        except perttirpc.RPCError as e:
+            self.status_bar.showMessage('Solver error: %s' % (e,))
+            return
+        if reply == 'unknown_session':
+            # Expired on the service, start over with a new one
+            self.on_connection_lost()
+            return
+
         status, ngrid, solved, eliminated = reply
-        self.grid.eliminate(eliminated)
-        self.grid.update_solved(solved, QtCore.Qt.blue)
+        self.grid.apply_step(solved, eliminated)
         # print reply
 
         if status == 'solved':
-            self.step_button.setDisabled(True)
+            self.solved = True
+        self.update_buttons()
+
+    def on_undo(self):
+        self.grid.undo()
+        self.update_buttons()
+
+    def on_redo(self):
+        self.grid.redo()
+        self.update_buttons()
+
+    def on_seek(self, step):
+        self.grid.seek(step)
+        self.update_buttons()
 
     def show(self):
         self.ui.show()
         self.ui.raise_()
+        self.timer.mark('window_shown')
 
     @QtCore.Slot(int, int, int, int)
     def paint_event(x, y, w, h):
         pass
 
 if __name__ == "__main__":
-    import sys
+    timer = StartupTimer(startup_t0, 'SUDOKU_STARTUP_TIMING' in os.environ)
     # app = QtGui.QApplication(sys.argv)
     # mainw = load_ui("sudoku.ui")
     # mainw.show()
-    app = SudokuApp(sys.argv)
+    app = SudokuApp(sys.argv, timer)
     app.show()
+    app.connect_rpc()
     app.exec_()
 
     # paintarea = mainw.findChild(QtGui.QWidget, "paint_area")
@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Load generator and latency benchmark for the sudoku service.
+#
+#   python sudokubench.py [-c CLIENTS] [-n PUZZLES | -d SECONDS]
+#                         [--rate PER_SECOND] [--verb solve|step]
+#                         [--socket PATH] [-o REPORT.json] [CORPUS]
+#
+# Without --socket a private service instance is started.  Without
+# --rate the clients run closed-loop, each starting its next puzzle as
+# soon as the previous one is done; with --rate puzzles are started on a
+# fixed schedule (open-loop) and puzzle latency is measured from the
+# scheduled start, so queueing delay is included.
+#
+from __future__ import print_function, division
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from six.moves import queue
+
+import perttirpc
+
+# Puzzles from tests/tc_sudoku.rb and the GUI
+DEFAULT_CORPUS = [
+    '610320000300400000058600000009503620000040000023801500000006750000004003000058014',
+    '000000000904607000076804100309701080008000300050308702007502610000403208000000000',
+    '300000000970010000600583000200000900500621003008000005000435002000090056000000001',
+    '014600300050000007090840100000400800600050009007009000008016030300000010009008570',
+    '200068050008002000560004801000000530400000002097000000804300096000800300030490007',
+    '100002000050090204000006700034001005500908007800400320009600000306010040000700009',
+]
+
+MAX_STEPS = 500
+
+class LocalService(object):
+    """Private sudokusvc.rb instance listening on a temporary socket."""
+    def __init__(self, ruby='ruby', timeout=10.0):
+        self.tmpdir = tempfile.mkdtemp(prefix='sudokubench-')
+        self.path = os.path.join(self.tmpdir, 'sudoku.sock')
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'sudokusvc.rb')
+        devnull = open(os.devnull, 'w')
+        self.process = subprocess.Popen([ruby, script, self.path],
+                                        stdout=devnull)
+        devnull.close()
+
+        deadline = time.time() + timeout
+        while True:
+            try:
+                perttirpc.connect_unix(self.path).close()
+                break
+            except (IOError, OSError):
+                if self.process.poll() is not None or time.time() > deadline:
+                    self.stop()
+                    raise IOError('sudoku service did not start')
+                time.sleep(0.05)
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+def percentile(values, p):
+    # values must be sorted
+    if not values:
+        return None
+    k = int(round(p / 100 * (len(values) - 1)))
+    return values[k]
+
+def summarize(latencies, errors=0):
+    values = sorted(latencies)
+    summary = {'count': len(values), 'errors': errors}
+    if values:
+        summary.update({
+            'mean': sum(values) / len(values) * 1000,
+            'p50': percentile(values, 50) * 1000,
+            'p90': percentile(values, 90) * 1000,
+            'p99': percentile(values, 99) * 1000,
+            'max': values[-1] * 1000,
+        })
+    return summary
+
+class Recorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.verbs = {}
+        self.puzzles = {}
+        self.errors = {}
+        self.outcomes = {}
+
+    def add(self, table, key, latency=None, error=None, total=False):
+        with self.lock:
+            latencies, errors = table.setdefault(key, ([], {}))
+            if latency is not None:
+                latencies.append(latency)
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+                if total:
+                    self.errors[error] = self.errors.get(error, 0) + 1
+
+    def verb(self, name, latency=None, error=None):
+        self.add(self.verbs, name, latency, error)
+
+    # A failed call also fails its puzzle, and connection errors only
+    # show up here, so the totals are counted per puzzle.
+    def puzzle(self, grid, latency=None, error=None, outcome=None):
+        self.add(self.puzzles, grid, latency, error, total=True)
+        if outcome is not None:
+            with self.lock:
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def report(self):
+        def table(t):
+            return dict((k, summarize(v[0], sum(v[1].values())))
+                        for k, v in t.items())
+        return {
+            'verbs': table(self.verbs),
+            'puzzles': table(self.puzzles),
+            'errors': dict(self.errors),
+            'outcomes': dict(self.outcomes),
+        }
+
+def timed_call(recorder, verb, fun, *args):
+    t0 = time.time()
+    try:
+        reply = fun(*args)
+    except Exception as e:
+        recorder.verb(verb, error='%s: %s' % (e.__class__.__name__, e))
+        raise
+    recorder.verb(verb, time.time() - t0)
+    return reply
+
+def run_puzzle(conn, grid, verb, recorder):
+    """Returns the outcome: solved, unsolved or invalid_grid"""
+    session = timed_call(recorder, 'init', conn.open_session, grid)
+    try:
+        if verb == 'solve':
+            reply = timed_call(recorder, 'solve', session.solve)
+        else:
+            for _ in range(MAX_STEPS):
+                reply = timed_call(recorder, 'step', session.step)
+                if reply == 'invalid_grid' or reply[0] == 'solved':
+                    break
+                if len(reply[2]) == 0 and len(reply[3]) == 0:
+                    break
+    finally:
+        timed_call(recorder, 'close', session.close)
+    if reply == 'invalid_grid':
+        return 'invalid_grid'
+    return str(reply[0])
+
+class Client(threading.Thread):
+    def __init__(self, path, jobs, verb, recorder):
+        super(Client, self).__init__()
+        self.daemon = True
+        self.path = path
+        self.jobs = jobs
+        self.verb = verb
+        self.recorder = recorder
+        self.conn = None
+        self.completed = 0
+
+    def run(self):
+        for start, grid in iter(self.jobs, None):
+            try:
+                if self.conn is None:
+                    sock = perttirpc.connect_unix(self.path)
+                    self.conn = perttirpc.Connection(sock)
+                outcome = run_puzzle(self.conn, grid, self.verb, self.recorder)
+            except Exception as e:
+                error = '%s: %s' % (e.__class__.__name__, e)
+                self.recorder.puzzle(grid, error=error)
+                if isinstance(e, (IOError, OSError)):
+                    self.conn = None
+                continue
+            self.recorder.puzzle(grid, time.time() - start, outcome=outcome)
+            self.completed += 1
+
+def closed_loop_jobs(corpus, count, duration):
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.time() + duration if duration else None
+
+    def next_job():
+        with lock:
+            n = next(counter)
+        if count is not None and n >= count:
+            return None
+        if deadline is not None and time.time() >= deadline:
+            return None
+        return time.time(), corpus[n % len(corpus)]
+    return next_job
+
+def open_loop_jobs(corpus, count, duration, rate, clients):
+    jobs = queue.Queue()
+
+    def schedule():
+        t0 = time.time()
+        for n in itertools.count():
+            if count is not None and n >= count:
+                break
+            start = t0 + n / rate
+            if duration and start - t0 >= duration:
+                break
+            delay = start - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            jobs.put((start, corpus[n % len(corpus)]))
+        for _ in range(clients):
+            jobs.put(None)
+
+    scheduler = threading.Thread(target=schedule)
+    scheduler.daemon = True
+    scheduler.start()
+    return jobs.get
+
+def run_benchmark(path, corpus, clients=1, count=None, duration=None,
+                  rate=None, verb='solve'):
+    recorder = Recorder()
+    if rate:
+        jobs = open_loop_jobs(corpus, count, duration, rate, clients)
+    else:
+        jobs = closed_loop_jobs(corpus, count, duration)
+
+    workers = [Client(path, jobs, verb, recorder) for _ in range(clients)]
+    t0 = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - t0
+
+    report = recorder.report()
+    completed = sum(worker.completed for worker in workers)
+    calls = sum(v['count'] for v in report['verbs'].values())
+    report.update({
+        'config': {
+            'clients': clients,
+            'mode': 'open' if rate else 'closed',
+            'rate': rate,
+            'puzzles': count,
+            'duration': duration,
+            'verb': verb,
+            'corpus_size': len(corpus),
+        },
+        'elapsed': elapsed,
+        'throughput': {
+            'puzzles_per_s': completed / elapsed,
+            'calls_per_s': calls / elapsed,
+        },
+    })
+    return report
+
+def read_corpus(filename):
+    with open(filename) as f:
+        return [line.strip() for line in f if len(line.strip()) == 81]
+
+def print_report(report, stream=sys.stdout):
+    print('%(puzzles_per_s).1f puzzles/s, %(calls_per_s).1f calls/s'
+          % report['throughput'], file=stream)
+    print('%-8s %8s %6s %9s %9s %9s %9s' %
+          ('verb', 'count', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'),
+          file=stream)
+    for verb, s in sorted(report['verbs'].items()):
+        if s['count']:
+            print('%-8s %8d %6d %9.2f %9.2f %9.2f %9.2f' %
+                  (verb, s['count'], s['errors'], s['p50'], s['p90'],
+                   s['p99'], s['max']), file=stream)
+        else:
+            print('%-8s %8d %6d' % (verb, 0, s['errors']), file=stream)
+    print(', '.join('%d %s' % (n, outcome) for outcome, n
+                    in sorted(report['outcomes'].items())), file=stream)
+    for error, n in sorted(report['errors'].items()):
+        print('error: %s (%d)' % (error, n), file=stream)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the sudoku service')
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('-c', '--clients', type=int, default=1)
+    parser.add_argument('-n', '--puzzles', type=int, default=None)
+    parser.add_argument('-d', '--duration', type=float, default=None)
+    parser.add_argument('--rate', type=float, default=None,
+                        help='puzzles started per second (open-loop)')
+    parser.add_argument('--verb', choices=['solve', 'step'], default='solve')
+    parser.add_argument('--socket', default=None,
+                        help='use a running service instead of starting one')
+    parser.add_argument('--ruby', default='ruby')
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args(argv)
+
+    corpus = read_corpus(args.corpus) if args.corpus else DEFAULT_CORPUS
+    if args.puzzles is None and args.duration is None:
+        args.puzzles = len(corpus)
+
+    service = None
+    path = args.socket
+    if path is None:
+        service = LocalService(args.ruby)
+        path = service.path
+    try:
+        report = run_benchmark(path, corpus, args.clients, args.puzzles,
+                               args.duration, args.rate, args.verb)
+    finally:
+        if service is not None:
+            service.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# Client side board state: 81 cell values and 81 9-bit candidate masks,
+# with the solver steps kept as deltas for undo/redo.
+#
+from __future__ import division
+
+import struct
+from array import array
+from collections import namedtuple
+
+from erlastic.constants import BINARY_EXT
+
+# solved:  array('B') of (index, value) pairs
+# removed: array('H') of (index, candidate bits) pairs
+Delta = namedtuple('Delta', ['solved', 'removed'])
+
+# Cell values 0..9 to ASCII digits with bytearray.translate
+DIGITS = bytes(bytearray(48 + i if i < 10 else 0 for i in range(256)))
+
+def cell_index(row, column):
+    # row		1..9
+    # column 	1..9
+    return (row - 1) * 9 + column - 1
+
+def cell_pos(index):
+    return (index // 9 + 1, index % 9 + 1)
+
+class Board(object):
+    def __init__(self):
+        self.values = bytearray(81)
+        self.masks = array('H', [0] * 81)
+        self.initial_values = bytearray(81)
+        self.initial_masks = array('H', [0] * 81)
+        self.history = []
+        self.position = 0
+
+    def load(self, solved, candidates):
+        """Set the initial state from get_solved and get_candidates replies."""
+        self.values = bytearray(81)
+        self.masks = array('H', [0] * 81)
+        for (row, col), num in solved:
+            self.values[cell_index(row, col)] = num
+        for (row, col), num in candidates:
+            self.masks[cell_index(row, col)] |= 1 << (num - 1)
+
+        self.initial_values = bytearray(self.values)
+        self.initial_masks = array('H', self.masks)
+        self.history = []
+        self.position = 0
+
+    def make_delta(self, solved, eliminated):
+        cells = array('B')
+        for (row, col), num in solved:
+            i = cell_index(row, col)
+            if self.values[i] != num:
+                cells.extend((i, num))
+
+        bits = {}
+        for (row, col), num in eliminated:
+            i = cell_index(row, col)
+            bit = 1 << (num - 1)
+            if self.masks[i] & bit:
+                bits[i] = bits.get(i, 0) | bit
+
+        removed = array('H')
+        for i in sorted(bits):
+            removed.extend((i, bits[i]))
+        return Delta(cells, removed)
+
+    def apply_step(self, solved, eliminated):
+        """Apply a step reply and record it, dropping any redo history."""
+        delta = self.make_delta(solved, eliminated)
+        del self.history[self.position:]
+        self.history.append(delta)
+        return self.redo()
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.history)
+
+    def redo(self):
+        delta = self.history[self.position]
+        solved, removed = delta
+        for k in range(0, len(solved), 2):
+            self.values[solved[k]] = solved[k + 1]
+        for k in range(0, len(removed), 2):
+            self.masks[removed[k]] &= ~removed[k + 1]
+        self.position += 1
+        return delta
+
+    def undo(self):
+        self.position -= 1
+        delta = self.history[self.position]
+        solved, removed = delta
+        for k in range(0, len(solved), 2):
+            self.values[solved[k]] = self.initial_values[solved[k]]
+        for k in range(0, len(removed), 2):
+            self.masks[removed[k]] |= removed[k + 1]
+        return delta
+
+    def seek(self, step):
+        """Move to the state after the given number of steps."""
+        step = max(0, min(step, len(self.history)))
+        while self.position < step:
+            self.redo()
+        while self.position > step:
+            self.undo()
+
+    def solved_cells(self, values=None):
+        if values is None:
+            values = self.values
+        return [(cell_pos(i), num) for i, num in enumerate(values) if num]
+
+    def candidate_cells(self, masks=None):
+        if masks is None:
+            masks = self.masks
+        cells = []
+        for i, mask in enumerate(masks):
+            num = 1
+            while mask:
+                if mask & 1:
+                    cells.append((cell_pos(i), num))
+                mask >>= 1
+                num += 1
+        return cells
+
+    def eliminated_cells(self):
+        masks = array('H', (a & ~b for a, b in zip(self.initial_masks,
+                                                    self.masks)))
+        return self.candidate_cells(masks)
+
+    def is_given(self, index):
+        return self.initial_values[index] != 0
+
+    def to_bytes(self):
+        return bytes(self.values.translate(DIGITS))
+
+    def to_string(self):
+        return self.to_bytes().decode('ascii')
+
+def encode_term(encoder, board):
+    """Board as the 81 character grid binary the service expects, for
+    ErlangTermEncoder.register"""
+    return [struct.pack(">BL", BINARY_EXT, 81), board.to_bytes()]
@@ -0,0 +1,324 @@
+#!/usr/bin/python
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Puzzle generator: random full grids with clues removed in symmetric
+# groups for as long as the solution stays unique.
+#
+#   python sudokugen.py [-n COUNT] [--clues N] [--symmetry NAME]
+#                       [--seed SEED] [-j JOBS] [--rate] [--band BAND]
+#                       [--attempts N] [--socket PATH] [-o OUTPUT]
+#
+# Output lines are "puzzle clues [rating]".  Puzzle n is generated from
+# seed (SEED, n), so the output does not depend on the number of jobs.
+# A puzzle is dropped if none of its ATTEMPTS full grids gets down to
+# the clue count; the number dropped is reported on stderr.
+# --rate solves each puzzle with profiling on and rates it by the
+# hardest technique the solver needed; --band keeps only puzzles in the
+# given bands.
+#
+from __future__ import print_function, division
+
+import argparse
+import multiprocessing
+import random
+import sys
+
+import perttirpc
+
+ROW = [i // 9 for i in range(81)]
+COL = [i % 9 for i in range(81)]
+BOX = [(i // 27) * 3 + (i % 9) // 3 for i in range(81)]
+POPCOUNT = [bin(mask).count('1') for mask in range(512)]
+
+SYMMETRIES = {
+    'none': lambda i: [i],
+    'rotational': lambda i: [i, 80 - i],
+    'diagonal': lambda i: [i, COL[i] * 9 + ROW[i]],
+    'mirror': lambda i: [i, ROW[i] * 9 + 8 - COL[i]],
+}
+
+# Solver::FINDERS in lib/sudoku.rb, simplest first
+TECHNIQUES = [
+    'find_singles_simple',
+    'find_singles',
+    'find_naked_pairs',
+    'find_naked_triples',
+    'find_hidden_pairs',
+    'find_hidden_triples',
+    'find_naked_quads',
+    'find_hidden_quads',
+    'find_pointing_pairs',
+    'find_boxline_reductions',
+    'find_xwings',
+    'find_ywings',
+    'find_xyzwings',
+]
+
+BANDS = {
+    'find_singles_simple': 'easy',
+    'find_singles': 'easy',
+    'find_naked_pairs': 'medium',
+    'find_naked_triples': 'medium',
+    'find_hidden_pairs': 'medium',
+    'find_hidden_triples': 'medium',
+    'find_naked_quads': 'hard',
+    'find_hidden_quads': 'hard',
+    'find_pointing_pairs': 'hard',
+    'find_boxline_reductions': 'hard',
+    'find_xwings': 'fiendish',
+    'find_ywings': 'fiendish',
+    'find_xyzwings': 'fiendish',
+}
+
+class Search(object):
+    """Backtracking over row, column and box bitmasks, always branching
+    on the empty cell with the fewest candidates."""
+    def __init__(self, cells, rng=None):
+        self.cells = list(cells)
+        self.rng = rng
+        self.rows = [0] * 9
+        self.cols = [0] * 9
+        self.boxes = [0] * 9
+        self.valid = True
+        self.empty = []
+        self.solution = None
+
+        for i, num in enumerate(self.cells):
+            if num == 0:
+                self.empty.append(i)
+                continue
+            bit = 1 << (num - 1)
+            if (self.rows[ROW[i]] | self.cols[COL[i]] | self.boxes[BOX[i]]) & bit:
+                self.valid = False
+            self.place(i, bit)
+
+    def place(self, i, bit):
+        self.rows[ROW[i]] |= bit
+        self.cols[COL[i]] |= bit
+        self.boxes[BOX[i]] |= bit
+
+    def unplace(self, i, bit):
+        self.rows[ROW[i]] &= ~bit
+        self.cols[COL[i]] &= ~bit
+        self.boxes[BOX[i]] &= ~bit
+
+    def count(self, limit):
+        if not self.valid:
+            return 0
+        return self.search(limit)
+
+    def search(self, limit):
+        empty = self.empty
+        if not empty:
+            if self.solution is None:
+                self.solution = list(self.cells)
+            return 1
+
+        rows, cols, boxes = self.rows, self.cols, self.boxes
+        best_k = -1
+        best_n = 10
+        best_mask = 0
+        for k, i in enumerate(empty):
+            mask = ~(rows[ROW[i]] | cols[COL[i]] | boxes[BOX[i]]) & 0x1ff
+            n = POPCOUNT[mask]
+            if n < best_n:
+                best_k, best_n, best_mask = k, n, mask
+                if n <= 1:
+                    break
+        if best_n == 0:
+            return 0
+
+        i = empty[best_k]
+        empty[best_k] = empty[-1]
+        empty.pop()
+
+        bits = [1 << d for d in range(9) if best_mask & (1 << d)]
+        if self.rng is not None:
+            self.rng.shuffle(bits)
+
+        count = 0
+        for bit in bits:
+            self.place(i, bit)
+            self.cells[i] = bit.bit_length()
+            count += self.search(limit - count)
+            self.cells[i] = 0
+            self.unplace(i, bit)
+            if count >= limit:
+                break
+
+        empty.append(i)
+        empty[best_k], empty[-1] = empty[-1], empty[best_k]
+        return count
+
+def parse_grid(grid):
+    return [int(c) for c in grid]
+
+def format_grid(cells):
+    return ''.join(str(num) for num in cells)
+
+def count_solutions(grid, limit=2):
+    """Number of solutions of an 81 character grid, counting stops at limit"""
+    return Search(parse_grid(grid)).count(limit)
+
+def random_solution(rng):
+    search = Search([0] * 81, rng)
+    search.count(1)
+    return search.solution
+
+def remove_clues(solution, rng, clues, symmetry):
+    cells = list(solution)
+    orbits = []
+    seen = set()
+    for i in range(81):
+        if i not in seen:
+            orbit = sorted(set(SYMMETRIES[symmetry](i)))
+            seen.update(orbit)
+            orbits.append(orbit)
+    rng.shuffle(orbits)
+
+    remaining = 81
+    for orbit in orbits:
+        if remaining - len(orbit) < clues:
+            continue
+        for i in orbit:
+            cells[i] = 0
+        if Search(cells).count(2) == 1:
+            remaining -= len(orbit)
+            if remaining == clues:
+                break
+        else:
+            for i in orbit:
+                cells[i] = solution[i]
+    return cells, remaining
+
+def generate(seed, clues=26, symmetry='rotational', attempts=20):
+    """Puzzle with a unique solution and at most clues givens, or None"""
+    rng = random.Random(seed)
+    for _ in range(attempts):
+        solution = random_solution(rng)
+        cells, remaining = remove_clues(solution, rng, clues, symmetry)
+        if remaining <= clues:
+            return format_grid(cells), remaining
+    return None
+
+def rate(conn, grid):
+    """Band of the hardest technique the solver needed"""
+    session = conn.open_session(grid)
+    try:
+        reply = session.solve()
+        if reply == 'invalid_grid' or reply[0] != 'solved':
+            return 'unsolved'
+        used = set(str(entry[0]) for entry in session.get_profile()
+                   if entry[2] > 0)
+    finally:
+        session.close()
+    hardest = [t for t in TECHNIQUES if t in used]
+    return BANDS[hardest[-1]] if hardest else 'easy'
+
+_worker = {}
+
+def init_worker(options):
+    _worker['options'] = options
+    if options['rate']:
+        conn = perttirpc.Connection(perttirpc.connect_unix(options['socket']))
+        conn.info('profile', True)
+        _worker['conn'] = conn
+
+def generate_job(n):
+    options = _worker['options']
+    result = generate('%d:%d' % (options['seed'], n), options['clues'],
+                      options['symmetry'], options['attempts'])
+    if result is None:
+        return None
+    grid, clues = result
+    rating = rate(_worker['conn'], grid) if options['rate'] else None
+    return grid, clues, rating
+
+def generate_batch(count, options, processes=None):
+    """(grid, clues, rating) for each puzzle, None for dropped ones"""
+    pool = multiprocessing.Pool(processes, init_worker, (options,))
+    try:
+        for result in pool.imap(generate_job, range(count)):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Generate sudoku puzzles')
+    parser.add_argument('-n', '--count', type=int, default=10)
+    parser.add_argument('--clues', type=int, default=26)
+    parser.add_argument('--symmetry', choices=sorted(SYMMETRIES),
+                        default='rotational')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--rate', action='store_true')
+    parser.add_argument('--band', action='append', default=[],
+                        choices=sorted(set(BANDS.values())) + ['unsolved'])
+    parser.add_argument('--attempts', type=int, default=20)
+    parser.add_argument('--socket', default=None)
+    parser.add_argument('--ruby', default='ruby')
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args(argv)
+
+    if args.band:
+        args.rate = True
+
+    service = None
+    path = args.socket
+    if args.rate and path is None:
+        from sudokubench import LocalService
+        service = LocalService(args.ruby)
+        path = service.path
+
+    options = {
+        'seed': args.seed,
+        'clues': args.clues,
+        'symmetry': args.symmetry,
+        'rate': args.rate,
+        'attempts': args.attempts,
+        'socket': path,
+    }
+    dropped = 0
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in generate_batch(args.count, options, args.jobs):
+            if result is None:
+                dropped += 1
+                continue
+            grid, clues, rating = result
+            if args.band and rating not in args.band:
+                continue
+            fields = [grid, str(clues)]
+            if rating is not None:
+                fields.append(rating)
+            out.write(' '.join(fields) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if service is not None:
+            service.stop()
+
+    if dropped:
+        print('%d of %d puzzles dropped, no unique puzzle with at most %d '
+              'clues in %d attempts' % (dropped, args.count, args.clues,
+                                        args.attempts), file=sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,273 @@
+# coding: latin1
+#
+# Copyright (c) 2015-2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import print_function, division
+
+from PySide import QtCore, QtGui
+
+from sudokuboard import Board, cell_index
+
+class GridPainter(object):
+    """Sudoku grid paint logic, independent of the paint device.
+
+    Everything is painted into self.canvas, a white QImage unless a
+    subclass overrides new_canvas(), from the state in self.board.
+    Painters opened here are ended before returning.
+    """
+    def init_geometry(self, cell_sz=64):
+        self.cell_sz = cell_sz
+        self.box_sz = 3 * self.cell_sz
+        self.grid_sz = 9 * self.cell_sz
+
+        self.num_sz = self.cell_sz // 3
+        self.num_font_sz = self.num_sz - 5
+
+    def new_canvas(self):
+        image = QtGui.QImage(self.grid_sz + 1, self.grid_sz + 1,
+                             QtGui.QImage.Format_RGB32)
+        image.fill(QtGui.QColor(QtCore.Qt.white).rgb())
+        return image
+
+    def reset(self):
+        self.board = Board()
+
+        self.canvas = self.new_canvas()
+        painter = self.get_pixmap_painter()
+        self.paint(painter)
+        painter.end()
+
+    def get_pixmap_painter(self):
+        return QtGui.QPainter(self.canvas)
+
+    def paint_grid(self, painter):
+        pen0 = QtGui.QPen()
+        pen1 = QtGui.QPen()
+        pen2 = QtGui.QPen()
+
+        pen0.setWidth(3)
+        pen1.setWidth(2)
+        pen2.setWidth(1)
+
+        painter.setPen(pen0)
+        painter.fillRect(QtCore.QRect(0, 0, self.grid_sz, self.grid_sz),
+                         QtCore.Qt.lightGray)
+        painter.drawRect(QtCore.QRect(0, 0, self.grid_sz, self.grid_sz))
+
+        for i in range(0, self.grid_sz + 1, self.cell_sz):
+            if i % self.box_sz == 0:
+                painter.setPen(pen1)
+            else:
+                painter.setPen(pen2)
+
+            painter.drawLine(i, 0, i, self.grid_sz)
+            painter.drawLine(0, i, self.grid_sz, i)
+
+    def candidate_rect(self, row, column, number):
+        num_sz = self.cell_sz // 3
+        x = (row - 1) * self.cell_sz
+        y = (column - 1) * self.cell_sz
+
+        offset = [2, 0, 1]		# 3, 1, 2
+        x += offset[number % 3] * num_sz
+        y += (number - 1) // 3 * num_sz
+
+        rect = QtCore.QRectF(x, y, num_sz, num_sz)
+        return rect
+
+    def paint_cell_candidate(self, row, column, number, painter):
+        # row		1..9
+        # column 	1..9
+
+        rect = self.candidate_rect(row, column, number)
+        painter.drawText(rect, QtCore.Qt.AlignCenter, "%d" % number)
+
+    def paint_cell_candidates(self, candidates, painter=None):
+        own_painter = painter is None
+        if own_painter:
+            painter = self.get_pixmap_painter()
+
+        painter.setFont(QtGui.QFont("Times", self.num_font_sz))
+
+        for (row, col), n in candidates:
+            self.paint_cell_candidate(row, col, n, painter)
+
+        if own_painter:
+            painter.end()
+
+    def cell_rect(self, row, column):
+        # row		1..9
+        # column 	1..9
+        x = (row - 1) * self.cell_sz
+        y = (column - 1) * self.cell_sz
+
+        rect = QtCore.QRectF(x, y, self.cell_sz, self.cell_sz)
+        return rect
+
+    def update_solved(self, cells, color=None):
+        painter = self.get_pixmap_painter()
+
+        for (row, col), num in cells:
+            self.board.values[cell_index(row, col)] = num
+        self.paint_solved(cells, painter, color)
+        painter.end()
+
+    def load(self, solved, candidates):
+        self.board.load(solved, candidates)
+        self.update_solved(solved, QtCore.Qt.black)
+        self.paint_cell_candidates(candidates)
+
+    def apply_step(self, solved, eliminated):
+        self.board.apply_step(solved, eliminated)
+        self.eliminate(eliminated)
+        self.update_solved(solved, QtCore.Qt.blue)
+
+    def undo(self):
+        if self.board.can_undo():
+            self.board.undo()
+            self.repaint_board()
+
+    def redo(self):
+        if self.board.can_redo():
+            self.board.redo()
+            self.repaint_board()
+
+    def seek(self, step):
+        self.board.seek(step)
+        self.repaint_board()
+
+    def repaint_board(self):
+        self.canvas = self.new_canvas()
+        painter = self.get_pixmap_painter()
+        self.paint(painter)
+        painter.end()
+
+    def paint_solved(self, cells, painter=None, color=QtCore.Qt.black):
+        own_painter = painter is None
+        if own_painter:
+            painter = self.get_pixmap_painter()
+
+        font_size = self.cell_sz * 5 // 8
+        painter.setFont(QtGui.QFont("Times", font_size))
+        pen = QtGui.QPen()
+        pen.setColor(color)
+        painter.setPen(pen)
+        for (row, col), num in cells:
+            rect = self.cell_rect(row, col)
+            self.blank_rect(rect, 2, painter)
+            painter.drawText(rect, QtCore.Qt.AlignCenter, "%d" % num)
+
+        if own_painter:
+            painter.end()
+
+    def paint(self, painter):
+        board = self.board
+        self.paint_grid(painter)
+        self.paint_cell_candidates(board.candidate_cells(board.initial_masks),
+                                   painter)
+        for (row, col), num in board.eliminated_cells():
+            self.blank_candidate(row, col, num, painter)
+
+        given = []
+        solved = []
+        for pos, num in board.solved_cells():
+            if board.is_given(cell_index(*pos)):
+                given.append((pos, num))
+            else:
+                solved.append((pos, num))
+        self.paint_solved(given, painter)
+        self.paint_solved(solved, painter, QtCore.Qt.blue)
+
+    def blank_rect(self, rect, width, painter, color=QtCore.Qt.lightGray):
+        rect = QtCore.QRect(rect.x() + width, rect.y() + width,
+                            rect.width() - 2 * width, rect.width() - 2 * width)
+        painter.fillRect(rect, color)
+
+    def border_rect(self, rect, width, painter, color=QtCore.Qt.lightGray):
+        pen = QtGui.QPen()
+        pen.setWidth(width)
+        pen.setColor(color)
+        painter.setPen(pen)
+
+        rect = QtCore.QRect(rect.x() + width, rect.y() + width,
+                            rect.width() - 2 * width, rect.width() - 2 * width)
+        painter.drawRect(rect)
+
+    def blank_cell(self, row, column, painter):
+        # row		1..9
+        # column 	1..9
+        self.blank_rect(self.cell_rect(row, column), 2, painter)
+
+    def blank_candidate(self, row, column, number, painter):
+        rect = self.candidate_rect(row, column, number)
+
+        dx = [-1, 1, 0]		# 3, 1, 2
+        dy = [1, 0, -1]
+        rect.translate(dx[number % 3], dy[(number - 1) // 3])
+        self.border_rect(rect, 1, painter, QtCore.Qt.red)
+
+    def eliminate(self, eliminated):
+        painter = self.get_pixmap_painter()
+        for (row, col), num in eliminated:
+            self.blank_candidate(row, col, num, painter)
+        painter.end()
+
+class SudokuGrid(GridPainter, QtGui.QWidget):
+    def __init__(self, *args, **kw):
+        super(SudokuGrid, self).__init__(*args, **kw)
+        self.init_geometry()
+        self.reset()
+
+    def new_canvas(self):
+        pixmap = QtGui.QPixmap(600, 600)
+        pixmap.fill(self, 0, 0)
+        return pixmap
+
+    def reset(self):
+        super(SudokuGrid, self).reset()
+        self.update()
+
+    def get_pixmap_painter(self):
+        painter = QtGui.QPainter(self.canvas)
+        painter.initFrom(self)
+        return painter
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter()
+        painter.begin(self)
+        painter.setClipRegion(event.region())
+        painter.drawPixmap(0, 0, self.canvas)
+        painter.end()
+
+    def eliminate(self, eliminated):
+        super(SudokuGrid, self).eliminate(eliminated)
+        self.update()
+
+    def repaint_board(self):
+        super(SudokuGrid, self).repaint_board()
+        self.update()
+
+    def mark_cell(self, row, column, painter):
+        pass
+
+    def mark_candidate(self, row, column, number, painter):
+        pass
+
+    def unmark_cell(self, row, column):
+        pass
+
+    def unmark_candidate(self, row, column, number, painter):
+        pass
@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Per technique solver profiles: collect them over a batch of puzzles
+# and rank the techniques by cost per elimination.
+#
+#   python sudokuprofile.py [--socket PATH] [--save PROFILES.jsonl]
+#                           [-o REPORT.json] [CORPUS]
+#   python sudokuprofile.py --load PROFILES.jsonl [--load ...]
+#
+from __future__ import print_function, division
+
+import argparse
+import json
+import sys
+
+import perttirpc
+from sudokubench import DEFAULT_CORPUS, LocalService, read_corpus
+
+FIELDS = ['calls', 'hits', 'time_us', 'solved', 'removed']
+
+def profile_to_dict(reply):
+    return dict((str(entry[0]), dict(zip(FIELDS, entry[1:])))
+                for entry in reply)
+
+def collect(conn, puzzles):
+    """Solve each puzzle with profiling on, yield (grid, status, profile)."""
+    conn.info('profile', True)
+    for grid in puzzles:
+        session = conn.open_session(grid)
+        try:
+            reply = session.solve()
+            status = 'invalid_grid' if reply == 'invalid_grid' else reply[0]
+            profile = profile_to_dict(session.get_profile())
+        finally:
+            session.close()
+        yield grid, str(status), profile
+
+def aggregate(profiles):
+    totals = {}
+    for profile in profiles:
+        for technique, entry in profile.items():
+            total = totals.setdefault(technique, dict.fromkeys(FIELDS, 0))
+            for field in FIELDS:
+                total[field] += entry[field]
+    return totals
+
+def rank(totals):
+    """Techniques sorted by time spent per eliminated candidate or solved
+    cell, most expensive first.  Techniques that never made progress come
+    first, by total time."""
+    rows = []
+    for technique, total in totals.items():
+        progress = total['solved'] + total['removed']
+        row = dict(total, technique=technique,
+                   hit_rate=total['hits'] / total['calls'] if total['calls'] else 0.0,
+                   us_per_elimination=total['time_us'] / progress if progress else None)
+        rows.append(row)
+    rows.sort(key=lambda row: (row['us_per_elimination'] is not None,
+                               -(row['us_per_elimination'] or row['time_us'])))
+    return rows
+
+def print_ranking(rows, stream=sys.stdout):
+    print('%-24s %8s %8s %7s %12s %8s %8s %12s' %
+          ('technique', 'calls', 'hits', 'hit %', 'time ms', 'solved',
+           'removed', 'us/elim'), file=stream)
+    for row in rows:
+        cost = row['us_per_elimination']
+        print('%-24s %8d %8d %7.1f %12.1f %8d %8d %12s' %
+              (row['technique'], row['calls'], row['hits'],
+               100 * row['hit_rate'], row['time_us'] / 1000, row['solved'],
+               row['removed'], '-' if cost is None else '%.1f' % cost),
+              file=stream)
+
+def load_profiles(filenames):
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)['profile']
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Profile solver techniques')
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('--socket', default=None,
+                        help='use a running service instead of starting one')
+    parser.add_argument('--ruby', default='ruby')
+    parser.add_argument('--load', action='append', default=[],
+                        help='aggregate previously saved profiles')
+    parser.add_argument('--save', default=None,
+                        help='write the per puzzle profiles as JSON lines')
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args(argv)
+
+    if args.load:
+        profiles = list(load_profiles(args.load))
+    else:
+        corpus = read_corpus(args.corpus) if args.corpus else DEFAULT_CORPUS
+        service = None
+        path = args.socket
+        if path is None:
+            service = LocalService(args.ruby)
+            path = service.path
+
+        save = open(args.save, 'w') if args.save else None
+        profiles = []
+        try:
+            conn = perttirpc.Connection(perttirpc.connect_unix(path))
+            for grid, status, profile in collect(conn, corpus):
+                profiles.append(profile)
+                if save is not None:
+                    save.write(json.dumps({'grid': grid, 'status': status,
+                                           'profile': profile}) + '\n')
+        finally:
+            if save is not None:
+                save.close()
+            if service is not None:
+                service.stop()
+
+    rows = rank(aggregate(profiles))
+    print_ranking(rows)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'puzzles': len(profiles), 'techniques': rows}, f,
+                      indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,232 @@
+#!/usr/bin/python
+# coding: latin1
+#
+# Copyright (c) 2016 Jani J. Hakala <jjhakala@gmail.com> Jyvskyl, Finland
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, version 3 of the
+#  License.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Offscreen rendering of puzzles, solution sheets and solve traces.
+#
+#   python sudokurender.py [-j N] [--solve | --trace] [--sheet COLUMNS]
+#                          [-o DIR] PUZZLES
+#
+# PUZZLES is a file with one 81 character grid per line.  --solve and
+# --trace need the sudoku service running.
+#
+from __future__ import print_function, division
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+# Must be set before the QApplication is created
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide import QtCore, QtGui
+
+import perttirpc
+from sudokugrid import GridPainter
+
+class ImageGrid(GridPainter):
+    def __init__(self, cell_sz=64):
+        self.init_geometry(cell_sz)
+        self.reset()
+
+    def snapshot(self):
+        return self.canvas.copy()
+
+def init_offscreen():
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        # No connection to a display server
+        app = QtGui.QApplication(sys.argv, False)
+    return app
+
+def grid_cells(grid):
+    return [((i // 9 + 1, i % 9 + 1), int(c))
+            for i, c in enumerate(grid) if c != '0']
+
+def render_puzzle(painter, grid, solution=None):
+    painter.reset()
+    painter.update_solved(grid_cells(grid), QtCore.Qt.black)
+    if solution is not None:
+        cells = [cell for i, cell in enumerate(grid_cells(solution))
+                 if grid[(cell[0][0] - 1) * 9 + cell[0][1] - 1] == '0']
+        painter.update_solved(cells, QtCore.Qt.blue)
+    return painter.snapshot()
+
+def trace_frames(painter, rpc, grid, max_steps=500):
+    rpc.call('sudoku', 'init', grid)
+    painter.reset()
+    painter.load(rpc.call('sudoku', 'get_solved'),
+                 rpc.call('sudoku', 'get_candidates'))
+    yield painter.snapshot()
+
+    steps = 0
+    replayed = False
+    while steps < max_steps:
+        reply = rpc.call('sudoku', 'step')
+        if reply == 'unknown_session':
+            # Expired on the service, replay the steps taken so far
+            if replayed:
+                raise perttirpc.SessionError('Session for %s expired' % grid)
+            rpc.call('sudoku', 'init', grid)
+            for _ in range(steps):
+                rpc.call('sudoku', 'step')
+            replayed = True
+            continue
+        replayed = False
+        steps += 1
+        if reply == 'invalid_grid':
+            break
+        status, ngrid, solved, eliminated = reply
+        if len(solved) == 0 and len(eliminated) == 0:
+            break
+
+        painter.apply_step(solved, eliminated)
+        yield painter.snapshot()
+        if status == 'solved':
+            break
+
+def sprite_sheet(images, columns):
+    width = images[0].width()
+    height = images[0].height()
+    rows = (len(images) + columns - 1) // columns
+
+    sheet = QtGui.QImage(columns * width, rows * height,
+                         QtGui.QImage.Format_RGB32)
+    sheet.fill(QtGui.QColor(QtCore.Qt.white).rgb())
+    painter = QtGui.QPainter(sheet)
+    for n, image in enumerate(images):
+        painter.drawImage((n % columns) * width, (n // columns) * height, image)
+    painter.end()
+    return sheet
+
+_worker = {}
+
+def init_worker(options):
+    _worker['app'] = init_offscreen()
+    _worker['painter'] = ImageGrid(options['cell_size'])
+    _worker['options'] = options
+    if options['mode'] != 'puzzle':
+        sock = perttirpc.connect_unix(options['socket'])
+        _worker['rpc'] = perttirpc.Connection(sock)
+
+def render_job(job):
+    """Render a chunk of (index, grid) pairs, return the written paths."""
+    options = _worker['options']
+    painter = _worker['painter']
+    outdir = options['outdir']
+    columns = options['sheet']
+    paths = []
+
+    def save(image, name):
+        path = os.path.join(outdir, name + '.png')
+        image.save(path, 'PNG')
+        paths.append(path)
+
+    images = []
+    for index, grid in job:
+        if options['mode'] == 'trace':
+            frames = list(trace_frames(painter, _worker['rpc'], grid))
+            if columns:
+                save(sprite_sheet(frames, columns), '%06d' % index)
+            else:
+                for n, frame in enumerate(frames):
+                    save(frame, '%06d-%03d' % (index, n))
+            continue
+
+        solution = None
+        if options['mode'] == 'solve':
+            _worker['rpc'].call('sudoku', 'init', grid)
+            reply = _worker['rpc'].call('sudoku', 'solve')
+            if reply != 'invalid_grid' and reply[0] == 'solved':
+                solution = bytes(reply[1]).decode('ascii')
+        image = render_puzzle(painter, grid, solution)
+        if columns:
+            images.append(image)
+        else:
+            save(image, '%06d' % index)
+
+    if images:
+        save(sprite_sheet(images, columns), 'sheet-%06d' % job[0][0])
+    return paths
+
+def read_puzzles(filename):
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 81:
+                yield line
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def render_batch(puzzles, options, processes=None):
+    if options['mode'] == 'puzzle' and options['sheet']:
+        size = options['sheet'] ** 2
+    else:
+        size = 16
+    jobs = chunks(enumerate(puzzles), size)
+
+    pool = multiprocessing.Pool(processes, init_worker, (options,))
+    try:
+        for paths in pool.imap(render_job, jobs):
+            for path in paths:
+                yield path
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Render sudoku puzzles to PNG')
+    parser.add_argument('puzzles')
+    parser.add_argument('-o', '--outdir', default='.')
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--cell-size', type=int, default=64)
+    parser.add_argument('--sheet', type=int, default=0, metavar='COLUMNS',
+                        help='combine images into sprite sheets')
+    parser.add_argument('--socket', default=None)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--solve', action='store_const', dest='mode',
+                       const='solve', help='render solution sheets')
+    group.add_argument('--trace', action='store_const', dest='mode',
+                       const='trace', help='render a frame per solver step')
+    args = parser.parse_args(argv)
+
+    options = {
+        'mode': args.mode or 'puzzle',
+        'outdir': args.outdir,
+        'cell_size': args.cell_size,
+        'sheet': args.sheet,
+        'socket': args.socket or perttirpc.default_socket_path(),
+    }
+    if not os.path.isdir(args.outdir):
+        os.makedirs(args.outdir)
+
+    count = 0
+    for path in render_batch(read_puzzles(args.puzzles), options, args.jobs):
+        count += 1
+    print('%d images written to %s' % (count, args.outdir))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -22,22 +22,110 @@ require 'securerandom'
 require 'socket'
 require 'pp'
 
-require_relative 'sudoku'
+require_relative 'lib/sudoku'
+require_relative 'shmring'
 
 user = ENV['USER']
 
+# ruby sudokusvc.rb [socket path]
+socket_path = ARGV[0] || "/tmp/sudokusocket-#{user}/sudoku.sock"
+socket_dir = File.dirname(socket_path)
+
+# Idle sessions are dropped after SESSION_TTL seconds, and the least
+# recently used ones once there are more than MAX_SESSIONS of them.  A
+# session's solver takes about 45 KB, so the default cap is about 45 MB.
+# Sessions are also dropped when the connection that created them closes.
+SESSION_TTL = Integer(ENV.fetch('SUDOKU_SESSION_TTL', 600))
+MAX_SESSIONS = Integer(ENV.fetch('SUDOKU_MAX_SESSIONS', 1000))
+
+module SudokuSvc
+  class Session
+    attr_reader :id, :solver, :last_used
+
+    def initialize(id, grid)
+      @id = id
+      @solver = Solver.new grid
+      @lock = Mutex.new
+      touch
+    end
+
+    def touch
+      @last_used = Process.clock_gettime(Process::CLOCK_MONOTONIC)
+    end
+
+    def synchronize(&block)
+      @lock.synchronize(&block)
+    end
+  end
+
+  class Registry
+    def initialize(ttl = SESSION_TTL, max_sessions = MAX_SESSIONS)
+      fail ArgumentError, "max_sessions must be at least 1, not #{max_sessions}" if max_sessions < 1
+      @ttl = ttl
+      @max_sessions = max_sessions
+      # Kept in least recently used first order
+      @sessions = {}
+      @lock = Mutex.new
+    end
+
+    def create(grid)
+      session = Session.new SecureRandom.hex(8), grid
+      @lock.synchronize do
+        expire
+        @sessions.shift while @sessions.length >= @max_sessions
+        @sessions[session.id] = session
+      end
+      session
+    end
+
+    def get(id)
+      @lock.synchronize do
+        expire
+        session = @sessions.delete id
+        unless session.nil?
+          session.touch
+          @sessions[id] = session
+        end
+        session
+      end
+    end
+
+    def delete(id)
+      @lock.synchronize { @sessions.delete id }
+    end
+
+    def length
+      @sessions.length
+    end
+
+    private
+
+    def expire
+      deadline = Process.clock_gettime(Process::CLOCK_MONOTONIC) - @ttl
+      loop do
+        _id, session = @sessions.first
+        break if session.nil? or session.last_used > deadline
+        @sessions.shift
+      end
+    end
+  end
+end
+
+SESSIONS = SudokuSvc::Registry.new
+
 class Connection
-  attr_accessor :handler
+  attr_accessor :handler, :shm
 
   def initialize(socket)
     @socket = socket
     @handler = nil
+    @shm = nil
   end
 
   def read_msg_length
     begin
       data = @socket.recv_nonblock 4
-      fail IOError, 'Connection closed' if data.empty?
+      fail IOError, 'Connection closed' if data.nil? or data.empty?
       berp_len = data.unpack('N')[0]
     rescue Errno::EAGAIN
       IO.select([@socket], [], [], 1.0)
@@ -53,7 +141,7 @@ class Connection
     while left > 0 do
       begin
         data = @socket.recv_nonblock left
-        if data.empty?
+        if data.nil? or data.empty?
           raise IOError, "Connection closed"
         end
         berp_msg << data
@@ -63,10 +151,21 @@ class Connection
         retry
       end
     end
+    # Large frames arrive through the ring, the socket has the doorbell
+    berp_msg = @shm.receive(berp_msg) if @shm and ShmChannel.doorbell?(berp_msg)
     berp_msg
   end
 
   def run_it
+    begin
+      serve
+    ensure
+      @handler.connection_closed unless @handler.nil?
+      @shm.close unless @shm.nil?
+    end
+  end
+
+  def serve
     loop do
       berp_len = read_msg_length
       berp_msg = read_msg(berp_len)
@@ -107,6 +206,10 @@ class Connection
 
   def send_reply(term)
     bin = BERT::Encoder.encode(term)
+    if @shm and bin.bytesize >= @shm.threshold
+      doorbell = @shm.send(bin)
+      bin = doorbell unless doorbell.nil?
+    end
     msg = [bin.length].pack('N') + bin
     # puts "BERT reply #{term} #{msg.length}"
     # bin.each_char { |c| printf '%02x ', c.ord }
@@ -124,6 +227,10 @@ class Handler
 
   def handle_call(m, f, a)
     # puts "BERT call #{m} #{f} #{a}"
+    unless respond_to? f
+      reply_error(:server, 2, 'NoSuchFunction', "function #{m}:#{f} not found")
+      return
+    end
     send(f, *a)
   end
 
@@ -138,6 +245,22 @@ class Handler
     self.send("cast_#{f}".to_sym, *a)
   end
 
+  def connection_closed
+  end
+
+  # {call, perttirpc, shm_attach, [Path, Size, Threshold]}: map the
+  # client's rings, see shmring.rb.  The reply still goes over the socket.
+  def shm_attach(path, size, threshold)
+    begin
+      channel = ShmChannel.new(path, size, threshold)
+    rescue SystemCallError, ArgumentError => e
+      reply_error(:user, 1, 'ShmError', e.message)
+      return
+    end
+    reply_ok
+    @connection.shm = channel
+  end
+
   def handle_error(m, f, a)
     puts "BERT error #{msg}"
   end
@@ -149,116 +272,215 @@ class Handler
   def reply(term)
     @connection.send_reply(t[:reply, term])
   end
+
+  def reply_error(type, code, klass, detail)
+    @connection.send_reply(t[:error, t[type, code, klass, detail, []]])
+  end
 end
 
+# Every call but init and solve_many takes an optional session id as its
+# first argument; without one the session last created on this
+# connection is used.
+#
+# {info, profile, true} turns on per technique profiling for sessions
+# created afterwards on the connection (and the current one), see
+# get_profile.
 class Sudoku_Handler < Handler
   def initialize(socket)
     super socket
+    @session = nil
+    @profiling = false
+    # Sessions created on this connection, and whether the last one was
+    # used without an id like the old single session clients do
+    @sessions = {}
+    @implicit = false
+  end
+
+  def connection_closed
+    @sessions.each_key { |id| SESSIONS.delete id }
+    @sessions.clear
+  end
+
+  def handle_info(command, options)
+    super
+    return unless command == :profile
+
+    # erlastic sends Python's True as the bare atom true
+    @profiling = (options == true or options == :true)
+    session = SESSIONS.get(@session) unless @session.nil?
+    session.synchronize { session.solver.enable_profile @profiling } unless session.nil?
+  end
+
+  def with_solver(id)
+    @implicit = true if id.nil?
+    session = SESSIONS.get(id || @session)
+    if session.nil?
+      reply(:unknown_session)
+      return
+    end
+    session.synchronize { yield session.solver }
   end
 
   def init(grid)
     puts "Sudoku init #{grid}"
-    @grid = grid
-    @solver = Solver.new @grid
+    # A client that never passes ids would leak one session per init
+    forget(@session) if @implicit and not @session.nil?
+    session = SESSIONS.create grid
+    session.solver.enable_profile if @profiling
+    @session = session.id
+    @sessions[session.id] = true
+    @implicit = false
+    reply(t[:ok, session.id])
+  end
+
+  def close(id = nil)
+    forget(id || @session)
     reply_ok
   end
 
-  def get_candidates
-    list = @solver.candidates.map { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
-    reply(list)
+  # [{Technique, Calls, Hits, Microseconds, Solved, Removed}]
+  def get_profile(id = nil)
+    with_solver(id) do |solver|
+      profile = solver.profile || {}
+      list = Solver::FINDERS.select { |finder| profile.key? finder }.map do |finder|
+        entry = profile[finder]
+        t[finder, entry.calls, entry.hits, (entry.time * 1_000_000).round,
+          entry.solved, entry.removed]
+      end
+      reply(list)
+    end
   end
 
-  def get_solved
-    list = @solver.grid.to_a.map! { |pos,cell| t[t[pos.row, pos.column], cell.value] }.select! { |x| x[1] > 0 }
-    reply(list)
+  def get_candidates(id = nil)
+    with_solver(id) do |solver|
+      list = solver.candidates.map { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
+      reply(list)
+    end
   end
 
-  def solve
+  def get_solved(id = nil)
+    with_solver(id) do |solver|
+      list = solver.grid.to_a.map! { |pos,cell| t[t[pos.row, pos.column], cell.value] }.select! { |x| x[1] > 0 }
+      reply(list)
+    end
+  end
+
+  def solve(id = nil)
     puts "Sudoku solve"
-    unless @solver.valid?
-      reply(:invalid_grid)
-      return
+    with_solver(id) do |solver|
+      unless solver.valid?
+        reply(:invalid_grid)
+        return
+      end
+      solver.solve
+      status = (solver.solved? and solver.valid?) ? :solved : :unsolved
+      reply(t[status, solver.to_s])
     end
-    @solver.solve
-    status = (@solver.solved? and @solver.valid?) ? :solved : :unsolved
-    reply(t[status, @solver.to_s])
   end
 
-  def solve_singles
-    unless @solver.valid?
-      reply(:invalid_grid)
-      return
+  # [{Status, Solution, Steps}] for a list of grids, in the same order.
+  # With Chunk > 0 the results are streamed instead, as {chunk, Results}
+  # replies of at most Chunk results followed by {done, Count}.  No
+  # sessions are created.
+  def solve_many(grids, chunk = 0)
+    puts "Sudoku solve_many #{grids.length}"
+    results = []
+    grids.each do |grid|
+      results << solve_grid(grid)
+      if chunk > 0 and results.length >= chunk
+        reply(t[:chunk, results])
+        results = []
+      end
+    end
+
+    if chunk > 0
+      reply(t[:chunk, results]) unless results.empty?
+      reply(t[:done, grids.length])
+    else
+      reply(results)
+    end
+  end
+
+  def solve_singles(id = nil)
+    with_solver(id) do |solver|
+      unless solver.valid?
+        reply(:invalid_grid)
+        return
+      end
+      solved, removed = solver.solve_singles
+      status = (solver.solved? and solver.valid?) ? :solved : :unsolved
+      solved.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
+      removed.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
+      reply(t[status, solver.to_s, solved, removed])
     end
-    solved, removed = @solver.solve_singles
-    status = (@solver.solved? and @solver.valid?) ? :solved : :unsolved
-    solved.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
-    removed.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
-    reply(t[status, @solver.to_s, solved, removed])
   end
 
-  def step
+  def step(id = nil)
     puts "Sudoku step"
-    unless @solver.valid?
-      reply(:invalid_grid)
-      return
+    with_solver(id) do |solver|
+      unless solver.valid?
+        reply(:invalid_grid)
+        return
+      end
+      solved, removed = solver.step
+      status = (solver.solved? and solver.valid?) ? :solved : :unsolved
+      solved.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
+      removed.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
+      reply(t[status, solver.to_s, solved, removed])
     end
-    solved, removed = @solver.step
-    status = (@solver.solved? and @solver.valid?) ? :solved : :unsolved
-    solved.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
-    removed.map! { |cell| t[t[cell.pos.row, cell.pos.column], cell.value] }
-    reply(t[status, @solver.to_s, solved, removed])
   end
-end
 
-# server = TCPServer.new 2000
-begin
-  if File.stat("/tmp/sudokusocket-#{user}").directory?
-    FileUtils.chmod 0700, "/tmp/sudokusocket-#{user}"
+  private
+
+  def forget(id)
+    SESSIONS.delete id
+    @sessions.delete id
+    @session = nil if id == @session
   end
-rescue Errno::ENOENT
-  FileUtils.mkdir "/tmp/sudokusocket-#{user}", mode: 0700
-end
 
-begin
-  if File.stat("/tmp/sudokusocket-#{user}/sudoku.sock").socket?
-    FileUtils.rm "/tmp/sudokusocket-#{user}/sudoku.sock"
+  def solve_grid(grid)
+    return t[:invalid_grid, grid, 0] unless grid =~ /\A\d{81}\z/
+    solver = Solver.new grid
+    return t[:invalid_grid, grid, 0] unless solver.valid?
+    solver.quiet = true
+    steps = solver.solve
+    status = (solver.solved? and solver.valid?) ? :solved : :unsolved
+    t[status, solver.to_s, steps]
   end
-rescue Errno::ENOENT
-  true
 end
 
-#
-# server = TCPServer.new 'localhost', 7777
-server = UNIXServer.new "/tmp/sudokusocket-#{user}/sudoku.sock"
-loop do
-  Thread.start(server.accept) do |client_sock|
-    begin
-      conn = Connection.new client_sock
-      handler = Sudoku_Handler.new conn
-      conn.handler = handler
-      conn.run_it
-    rescue
-      pp $ERROR_INFO
+# Only serve when run as a script, the handlers can be loaded in tests
+if __FILE__ == $PROGRAM_NAME
+  # server = TCPServer.new 2000
+  begin
+    if File.stat(socket_dir).directory?
+      FileUtils.chmod 0700, socket_dir
     end
+  rescue Errno::ENOENT
+    FileUtils.mkdir socket_dir, mode: 0700
+  end
+
+  begin
+    if File.stat(socket_path).socket?
+      FileUtils.rm socket_path
+    end
+  rescue Errno::ENOENT
+    true
   end
-end
 
-# module SudokuSvc
-#   class State
-#     def initialize(grid)
-#       @grid = grid
-#     end
-#   end
-
-#   class SudokuSvc
-#     def initialize
-#       @sessions = {}
-#     end
-
-#     def init(grid)
-#       key = SecureRandom.base64
-#       @sessions[key] = State.new grid
-#       return grid
-#     end
-#   end
-# end
+  #
+  # server = TCPServer.new 'localhost', 7777
+  server = UNIXServer.new socket_path
+  loop do
+    Thread.start(server.accept) do |client_sock|
+      begin
+        conn = Connection.new client_sock
+        handler = Sudoku_Handler.new conn
+        conn.handler = handler
+        conn.run_it
+      rescue
+        pp $ERROR_INFO
+      end
+    end
+  end
+end
@@ -0,0 +1,61 @@
+require 'helper'
+
+require 'tempfile'
+require 'test/unit'
+
+require_relative '../shmring'
+
+class TestShmChannel < Test::Unit::TestCase
+  HEADER = ShmChannel::HEADER_SIZE
+  SIZE = 16
+
+  def setup
+    @file = Tempfile.new('shmring')
+    @file.binmode
+    @file.truncate(2 * (HEADER + SIZE))
+    @channel = ShmChannel.new(@file.path, SIZE, 8)
+  end
+
+  def teardown
+    @channel.close
+    @file.close!
+  end
+
+  def peek(offset, length)
+    File.open(@file.path, 'rb') { |f| f.pread(length, offset) }
+  end
+
+  def poke(offset, data)
+    File.open(@file.path, 'r+b') { |f| f.pwrite(data, offset) }
+  end
+
+  def test_size_mismatch
+    assert_raise(ArgumentError) { ShmChannel.new(@file.path, SIZE * 2, 8) }
+    assert_raise(Errno::ENOENT) { ShmChannel.new(@file.path + '.x', SIZE, 8) }
+  end
+
+  def test_doorbell
+    assert(ShmChannel.doorbell?("\x00abc".b))
+    assert(!ShmChannel.doorbell?("\x83abc".b))
+  end
+
+  def test_receive_wraps
+    # Client wrote 6 bytes at position 12, the last 2 wrapped to the start
+    poke(HEADER + 12, 'abcd')
+    poke(HEADER, 'ef')
+    doorbell = "\x00".b + [12, 6].pack('Q>L>')
+    assert_equal('abcdef', @channel.receive(doorbell))
+    assert_equal([18].pack('Q<'), peek(0, 8))
+  end
+
+  def test_send_wraps_and_fills
+    tx = HEADER + SIZE
+    assert_equal("\x00".b + [0, 12].pack('Q>L>'), @channel.send('x' * 12))
+    # Only 4 bytes free until the client moves its read position
+    assert_nil(@channel.send('y' * 6))
+    poke(tx, [12].pack('Q<'))
+    assert_equal("\x00".b + [12, 6].pack('Q>L>'), @channel.send('abcdef'))
+    assert_equal('abcd', peek(tx + HEADER + 12, 4))
+    assert_equal('ef', peek(tx + HEADER, 2))
+  end
+end
@@ -41,4 +41,36 @@ class TestSudoku < Test::Unit::TestCase
   def test_xyzwing
     assert(test_grid('100002000050090204000006700034001005500908007800400320009600000306010040000700009'))
   end
+
+  def test_profile
+    solver = Solver.new '014600300050000007090840100000400800600050009007009000008016030300000010009008570'
+    solver.enable_profile
+    solver.solve
+    assert(solver.solved?)
+
+    profile = solver.profile
+    assert(profile.keys.all? { |finder| Solver::FINDERS.include? finder })
+    assert(profile.values.all? { |entry| entry.hits <= entry.calls })
+    assert(profile[:find_singles_simple].hits > 0)
+    assert(profile[:find_ywings].hits > 0)
+    assert(profile[:find_ywings].removed > 0)
+  end
+
+  def test_solve_steps
+    grid = '014600300050000007090840100000400800600050009007009000008016030300000010009008570'
+    solver = Solver.new grid
+    steps = solver.solve
+    assert(solver.solved?)
+
+    stepper = Solver.new grid
+    count = 0
+    until stepper.solved?
+      solved, removed = stepper.step
+      break if solved.empty? and removed.empty?
+      count += 1
+    end
+    assert(steps > 0)
+    assert_equal(count, steps)
+    assert_equal(0, Solver.new(solver.to_s).solve)
+  end
 end
@@ -0,0 +1,179 @@
+require 'helper'
+
+require 'bert'
+require 'socket'
+require 'stringio'
+require 'tempfile'
+require 'test/unit'
+
+require_relative '../sudokusvc'
+
+GRID = '014600300050000007090840100000400800600050009007009000008016030300000010009008570'
+
+# Collects the replies instead of framing them on a socket
+class ReplyLog
+  attr_reader :replies
+
+  def initialize
+    @replies = []
+  end
+
+  def send_reply(term)
+    @replies << term
+  end
+
+  def last
+    @replies.last[1]
+  end
+end
+
+class TestSudokuSvc < Test::Unit::TestCase
+  def setup
+    @log = ReplyLog.new
+    @handler = Sudoku_Handler.new @log
+  end
+
+  def call(f, *args)
+    @handler.handle_call(:sudoku, f, args)
+    @log.last
+  end
+
+  def test_profile_info
+    # BERT true and erlastic's bare atom true
+    [true, :true].each do |flag|
+      @handler.handle_info(:profile, flag)
+      call(:init, GRID)
+      call(:solve)
+      profile = call(:get_profile)
+      assert(!profile.empty?)
+      assert(profile.any? { |entry| entry[0] == :find_ywings and entry[2] > 0 })
+      call(:close)
+    end
+
+    @handler.handle_info(:profile, :false)
+    call(:init, GRID)
+    call(:solve)
+    assert_equal([], call(:get_profile))
+  end
+
+  def test_sessions_closed_with_connection
+    a = call(:init, GRID)[1]
+    b = call(:init, GRID)[1]
+    assert(call(:get_solved, a).length > 0)
+    assert(!SESSIONS.get(b).nil?)
+
+    @handler.connection_closed
+    assert_nil(SESSIONS.get(a))
+    assert_nil(SESSIONS.get(b))
+  end
+
+  def test_legacy_init_replaces_session
+    first = call(:init, GRID)[1]
+    call(:step)
+    second = call(:init, GRID)[1]
+    assert_nil(SESSIONS.get(first))
+    assert(!SESSIONS.get(second).nil?)
+
+    # Sessions used by id are kept
+    third = call(:init, GRID)[1]
+    call(:step, second)
+    call(:init, GRID)
+    assert(!SESSIONS.get(second).nil?)
+    assert(!SESSIONS.get(third).nil?)
+    @handler.connection_closed
+  end
+
+  def test_registry_cap
+    assert_raise(ArgumentError) { SudokuSvc::Registry.new(600, 0) }
+    registry = SudokuSvc::Registry.new(600, 2)
+    ids = (1..3).map { registry.create(GRID).id }
+    assert_equal(2, registry.length)
+    assert_nil(registry.get(ids[0]))
+  end
+
+  def test_run_it_closes_sessions
+    ours, theirs = UNIXSocket.pair
+    conn = Connection.new ours
+    handler = Sudoku_Handler.new conn
+    conn.handler = handler
+    handler.handle_call(:sudoku, :init, [GRID])
+    id = handler.instance_variable_get(:@session)
+    assert(!SESSIONS.get(id).nil?)
+
+    theirs.recv(65536)
+    theirs.close
+    assert_raise(IOError) { conn.run_it }
+    assert_nil(SESSIONS.get(id))
+  ensure
+    ours.close
+  end
+
+  def test_shm_attach
+    ours, theirs = UNIXSocket.pair
+    conn = Connection.new ours
+    conn.handler = Sudoku_Handler.new conn
+    size = 4096
+    file = Tempfile.new('shmring')
+    file.truncate(2 * (ShmChannel::HEADER_SIZE + size))
+
+    conn.handler.handle_call(:perttirpc, :shm_attach, [file.path, size - 1, 64])
+    assert_nil(conn.shm)
+    theirs.recv(65536)
+    conn.handler.handle_call(:perttirpc, :shm_attach, [file.path, size, 64])
+    assert(!conn.shm.nil?)
+
+    # Small replies stay on the socket, large ones leave a doorbell
+    reply = theirs.recv(65536)
+    assert(!ShmChannel.doorbell?(reply[4..-1]))
+    conn.send_reply(t[:reply, 'x' * 1000])
+    length = theirs.recv(4).unpack('N')[0]
+    assert_equal(13, length)
+    assert(ShmChannel.doorbell?(theirs.recv(length)))
+
+    # Doorbells from the client are resolved, other frames pass through
+    File.open(file.path, 'r+b') { |f| f.pwrite('hello', ShmChannel::HEADER_SIZE) }
+    [["\x00".b + [0, 5].pack('Q>L>'), 'hello'], ["\x83abc".b, "\x83abc".b]].each do |frame, expected|
+      theirs.send([frame.length].pack('N') + frame, 0)
+      assert_equal(expected, conn.read_msg(conn.read_msg_length))
+    end
+  ensure
+    conn.shm.close unless conn.nil? or conn.shm.nil?
+    file.close! unless file.nil?
+    ours.close
+    theirs.close
+  end
+
+  def test_solve_many
+    grids = [GRID, GRID.sub('0', 'x'), GRID.sub('01', '11')]
+    out = capture { call(:solve_many, grids) }
+    results = @log.last
+    assert_equal(1, @log.replies.length)
+    assert_equal(:solved, results[0][0])
+    assert_equal(81, results[0][1].length)
+    assert(!results[0][1].include?('0'))
+    assert(results[0][2] > 0)
+    assert_equal([:invalid_grid, grids[1], 0], results[1])
+    assert_equal([:invalid_grid, grids[2], 0], results[2])
+    # One line for the call, nothing from the solver
+    assert_equal(1, out.lines.length)
+  end
+
+  def test_solve_many_chunks
+    grids = [GRID] * 5
+    capture { call(:solve_many, grids, 2) }
+    replies = @log.replies.map { |reply| reply[1] }
+    assert_equal([:chunk, :chunk, :chunk, :done], replies.map { |r| r[0] })
+    assert_equal([2, 2, 1], replies[0..2].map { |r| r[1].length })
+    assert_equal(5, replies[3][1])
+    assert(replies[0..2].all? { |r| r[1].all? { |result| result[0] == :solved } })
+  end
+
+  def capture
+    saved = $stdout
+    $stdout = StringIO.new
+    yield
+    $stdout.string
+  ensure
+    $stdout = saved
+  end
+end
@@ -0,0 +1,101 @@
+import struct
+import unittest
+
+from erlastic import Atom, ErlangTermDecoder, ErlangTermEncoder
+from erlastic.constants import *
+from erlastic.types import PID, Port, Reference, Export
+import sudokuboard
+
+TERMS = [
+    0, 255, 256, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 31, -2 ** 40, 2 ** 2100,
+    1.5, True, False, None,
+    Atom('ok'), b'', b'bytes',
+    (), (1, Atom('a')), tuple(range(300)),
+    [], [1, [2, [3]]], list(range(300)),
+    PID(Atom('node@host'), 1, 2, 3),
+    Port(Atom('node@host'), 4, 1),
+    Reference(Atom('node@host'), [1, 2, 3], 0),
+    Export(Atom('lists'), Atom('map'), 2),
+]
+
+class Grid(object):
+    def __init__(self, grid):
+        self.grid = grid
+
+class SubAtom(Atom):
+    pass
+
+def tag(data):
+    # Term tag after the version byte
+    return bytearray(data)[1]
+
+def encode_grid(encoder, obj):
+    return encoder.encode_part(obj.grid.encode('ascii'))
+
+class TestEncoder(unittest.TestCase):
+    def setUp(self):
+        self.encoder = ErlangTermEncoder()
+        self.decoder = ErlangTermDecoder()
+
+    def round_trip(self, term, **kw):
+        return self.decoder.decode(self.encoder.encode(term, **kw))
+
+    def test_round_trip(self):
+        for term in TERMS:
+            self.assertEqual(self.round_trip(term), term)
+
+    def test_compressed(self):
+        term = [b'0' * 81] * 100
+        data = self.encoder.encode(term, compressed=True)
+        self.assertEqual(tag(data), COMPRESSED)
+        self.assertEqual(self.decoder.decode(data), term)
+        with self.assertRaises(TypeError):
+            self.encoder.encode(term, compressed=10)
+
+    def test_small_integers(self):
+        self.assertEqual(self.encoder.encode(7),
+                         b'\x83' + struct.pack('>BB', SMALL_INTEGER_EXT, 7))
+        self.assertEqual(tag(self.encoder.encode(256)), INTEGER_EXT)
+
+    def test_big_integers(self):
+        data = self.encoder.encode(2 ** 40)
+        self.assertEqual(data, b'\x83' + struct.pack('>BBB', SMALL_BIG_EXT, 6, 0) +
+                         b'\x00\x00\x00\x00\x00\x01')
+        self.assertEqual(tag(self.encoder.encode(2 ** 2100)), LARGE_BIG_EXT)
+
+    def test_pid(self):
+        data = self.encoder.encode(PID(Atom('n'), 1, 2, 3))
+        self.assertEqual(tag(data), PID_EXT)
+
+    def test_unknown_type(self):
+        with self.assertRaises(NotImplementedError):
+            self.encoder.encode(object())
+
+    def test_subclass(self):
+        # bool is an int subclass with its own encoder
+        self.assertEqual(self.round_trip(True), True)
+        self.assertEqual(self.round_trip(SubAtom('x')), Atom('x'))
+        self.assertEqual(self.encoder.subclass_encoders[SubAtom],
+                         self.encoder.encode_atom)
+
+    def test_register(self):
+        self.encoder.register(Grid, encode_grid)
+        self.assertEqual(self.round_trip([Grid('123')]), [b'123'])
+
+        class SubGrid(Grid):
+            pass
+        self.assertEqual(self.round_trip(SubGrid('4')), b'4')
+
+        # Registering clears the subclass cache
+        self.encoder.register(SubGrid, lambda encoder, obj: encoder.encode_part(1))
+        self.assertEqual(self.round_trip(SubGrid('4')), 1)
+
+    def test_board(self):
+        self.encoder.register(sudokuboard.Board, sudokuboard.encode_term)
+        board = sudokuboard.Board()
+        board.load([((1, 1), 5), ((9, 9), 1)], [])
+        grid = self.round_trip((Atom('call'), Atom('sudoku'), Atom('init'), [board]))[3][0]
+        self.assertEqual(grid, b'5' + b'0' * 79 + b'1')
+
+if __name__ == '__main__':
+    unittest.main()
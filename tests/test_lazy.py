@@ -0,0 +1,92 @@
+import struct
+import unittest
+
+from erlastic import Atom, ErlangTermDecoder, ErlangTermEncoder, TupleView, ListView
+from erlastic.constants import *
+
+from tests.test_codec import TERMS
+
+# Encodings erlastic reads but does not write
+RAW_TERMS = [
+    (struct.pack('>B', NEW_FLOAT_EXT) + struct.pack('>d', 1.5), 1.5),
+    (struct.pack('>BH', STRING_EXT, 3) + b'abc', b'abc'),
+    (struct.pack('>BB', SMALL_ATOM_EXT, 2) + b'ok', Atom('ok')),
+]
+
+MARKER = Atom('marker')
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        self.encoder = ErlangTermEncoder()
+        self.decoder = ErlangTermDecoder()
+
+    def test_skip_part(self):
+        for term in TERMS:
+            data = bytearray(self.encoder.encode(term))
+            self.assertEqual(self.decoder.skip_part(data, 1), len(data), term)
+
+    def test_skip_raw(self):
+        # Each raw term followed by a marker in a list
+        marker = self.encoder.encode(MARKER)[1:]
+        for raw, term in RAW_TERMS:
+            data = bytearray(b'\x83' + struct.pack('>BL', LIST_EXT, 2) +
+                             raw + marker + struct.pack('B', NIL_EXT))
+            view = self.decoder.decode(data, lazy=True)
+            self.assertEqual(view[1], MARKER)
+            self.assertEqual(view[0], term)
+
+    def test_offsets(self):
+        # Every term type in front of a marker
+        for term in TERMS:
+            data = self.encoder.encode((term, MARKER))
+            view = self.decoder.decode(data, lazy=True)
+            self.assertEqual(view[1], MARKER, term)
+
+    def test_views(self):
+        term = (Atom('unsolved'), b'0' * 81,
+                [((1, 2), 3), ((4, 5), 6)], [], tuple(range(300)))
+        data = self.encoder.encode(term)
+        view = self.decoder.decode(data, lazy=True)
+
+        self.assertIsInstance(view, TupleView)
+        self.assertIsInstance(view[2], ListView)
+        self.assertIsInstance(view[2][0], TupleView)
+        self.assertEqual(len(view), 5)
+        self.assertEqual(view[0], 'unsolved')
+        self.assertEqual(view[-1][299], 299)
+        self.assertEqual(view[2][1][0], (4, 5))
+        self.assertEqual(view[3], [])
+        self.assertEqual(view[1:3], (b'0' * 81, [((1, 2), 3), ((4, 5), 6)]))
+        self.assertEqual(list(view[2]), [((1, 2), 3), ((4, 5), 6)])
+        self.assertEqual(view.materialize(), self.decoder.decode(data))
+        self.assertEqual(view, term)
+        with self.assertRaises(IndexError):
+            view[5]
+
+    def test_compressed(self):
+        term = [b'0' * 81] * 100
+        data = self.encoder.encode(term, compressed=True)
+        view = self.decoder.decode(data, lazy=True)
+        self.assertIsInstance(view, ListView)
+        self.assertEqual(view[99], b'0' * 81)
+
+    def test_equality_does_not_decode(self):
+        data = self.encoder.encode((Atom('solved'), [(i, i) for i in range(1000)]))
+        view = self.decoder.decode(data, lazy=True)
+
+        calls = []
+        decode_part = self.decoder.decode_part
+        def counting(*args):
+            calls.append(args)
+            return decode_part(*args)
+        self.decoder.decode_part = counting
+
+        self.assertFalse(view == 'unknown_session')
+        self.assertTrue(view != 'unknown_session')
+        self.assertFalse(view == Atom('unknown_session'))
+        self.assertEqual(calls, [])
+        self.assertEqual(view[0], 'solved')
+        self.assertEqual(len(calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
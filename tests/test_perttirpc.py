@@ -0,0 +1,117 @@
+import socket
+import threading
+import unittest
+
+from erlastic import Atom
+import perttirpc
+
+class Peer(threading.Thread):
+    """Answers each call on the far end of a socket pair with the given
+    reply terms, in order"""
+    def __init__(self, sock, replies):
+        super(Peer, self).__init__()
+        self.daemon = True
+        self.conn = perttirpc.Connection(sock)
+        self.replies = replies
+        self.calls = []
+
+    def run(self):
+        try:
+            for terms in self.replies:
+                size, data = self.conn.recv_packet4()
+                self.calls.append(self.conn.decoder.decode(data))
+                for term in terms:
+                    self.conn.send_packet4(
+                        self.conn.encoder.encode((Atom('reply'), term)))
+        except IOError:
+            pass
+
+def chunk(results):
+    return (Atom('chunk'), results)
+
+def done(count):
+    return (Atom('done'), count)
+
+def result(n):
+    return (Atom('solved'), b'%081d' % n, n)
+
+class TestCallStream(unittest.TestCase):
+    def connect(self, replies):
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        peer = Peer(theirs, replies)
+        peer.start()
+        return perttirpc.Connection(ours), peer
+
+    def test_chunks(self):
+        conn, peer = self.connect([
+            [chunk([result(1), result(2)]), chunk([result(3)]), done(3)],
+        ])
+        chunks = list(conn.call_stream('sudoku', 'solve_many', [[], 2]))
+        self.assertEqual(chunks, [[result(1), result(2)], [result(3)]])
+        self.assertFalse(conn.lock.locked())
+
+    def test_early_close_drains(self):
+        conn, peer = self.connect([
+            [chunk([result(1)]), chunk([result(2)]), chunk([result(3)]), done(3)],
+            [[result(4)]],
+        ])
+        stream = conn.call_stream('sudoku', 'solve_many', [[], 1])
+        self.assertEqual(next(stream), [result(1)])
+        stream.close()
+        self.assertFalse(conn.lock.locked())
+        # The rest of the stream is not taken as the next reply
+        self.assertEqual(conn.call('sudoku', 'solve_many', [[]]), [result(4)])
+
+    def test_reentrant_call(self):
+        conn, peer = self.connect([
+            [chunk([result(1)]), chunk([result(2)]), done(2)],
+            [[result(3)]],
+        ])
+        stream = conn.call_stream('sudoku', 'solve_many', [[], 1])
+        self.assertEqual(next(stream), [result(1)])
+        with self.assertRaises(RuntimeError):
+            conn.call('sudoku', 'solve_many', [[]])
+        with self.assertRaises(RuntimeError):
+            next(conn.call_stream('sudoku', 'solve_many', [[], 1]))
+        with self.assertRaises(RuntimeError):
+            conn.cast('sudoku', 'close')
+        with self.assertRaises(RuntimeError):
+            conn.info('profile', True)
+        self.assertEqual(list(stream), [[result(2)]])
+        self.assertIsNone(conn.streaming)
+        self.assertEqual(conn.call('sudoku', 'solve_many', [[]]), [result(3)])
+
+    def test_error(self):
+        error = (Atom('error'), (Atom('server'), 2, b'NoSuchFunction', b'', []))
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        peer = perttirpc.Connection(theirs)
+        conn = perttirpc.Connection(ours)
+        peer.send_packet4(peer.encoder.encode(error))
+        with self.assertRaises(perttirpc.RPCError):
+            list(conn.call_stream('sudoku', 'solve_many', [[], 1]))
+        self.assertFalse(conn.lock.locked())
+
+    def test_solve_many_batches(self):
+        conn, peer = self.connect([
+            [[result(1), result(2)]],
+            [[result(3)]],
+        ])
+        grids = ['%081d' % n for n in range(3)]
+        results = list(conn.solve_many(iter(grids), batch=2))
+        self.assertEqual(results, [result(1), result(2), result(3)])
+        self.assertEqual([len(call[3][0]) for call in peer.calls], [2, 1])
+
+    def test_solve_many_streamed(self):
+        conn, peer = self.connect([
+            [chunk([result(1)]), chunk([result(2)]), done(2)],
+        ])
+        results = list(conn.solve_many(['0' * 81] * 2, chunk=1))
+        self.assertEqual(results, [result(1), result(2)])
+        self.assertEqual(peer.calls[0][3][1], 1)
+
+if __name__ == '__main__':
+    unittest.main()
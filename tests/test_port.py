@@ -0,0 +1,140 @@
+import io
+import os
+import select
+import struct
+import sys
+import unittest
+
+import erlastic
+from erlastic import Atom, ErlangTermEncoder, PortDriver
+from erlastic.port import FLUSH_BATCH, FLUSH_EACH, FLUSH_MANUAL
+
+def frame(term):
+    data = ErlangTermEncoder().encode(term)
+    return struct.pack('>L', len(data)) + data
+
+class TestPortDriver(unittest.TestCase):
+    def setUp(self):
+        self.in_r, self.in_w = os.pipe()
+        self.out_r, self.out_w = os.pipe()
+        for fd in (self.in_r, self.out_r, self.out_w):
+            self.addCleanup(os.close, fd)
+
+    def driver(self, **kw):
+        return PortDriver(self.in_r, self.out_w, **kw)
+
+    def write(self, data):
+        os.write(self.in_w, data)
+
+    def end_input(self):
+        os.close(self.in_w)
+        self.in_w = None
+
+    def tearDown(self):
+        if self.in_w is not None:
+            os.close(self.in_w)
+
+    def written(self):
+        data = b''
+        while select.select([self.out_r], [], [], 0)[0]:
+            data += os.read(self.out_r, 65536)
+        return data
+
+    def test_split_frame(self):
+        port = self.driver()
+        data = frame((Atom('call'), [1, 2, 3]))
+        self.write(data[:2])
+        self.assertTrue(port.fill())
+        self.assertEqual(port.frames(), [])
+        self.write(data[2:7])
+        self.assertTrue(port.fill())
+        self.assertEqual(port.frames(), [])
+        self.write(data[7:])
+        self.assertEqual(port.receive_batch(), [(Atom('call'), [1, 2, 3])])
+        self.assertEqual(port.inbuf, bytearray())
+
+    def test_batch(self):
+        port = self.driver()
+        self.write(frame(1) + frame(b'two') + frame([3]) + frame(4)[:3])
+        self.assertTrue(port.fill())
+        self.assertEqual(port.receive_batch(), [1, b'two', [3]])
+        # The partial frame stays in the buffer
+        self.assertEqual(len(port.inbuf), 3)
+
+    def test_clean_eof(self):
+        port = self.driver()
+        self.write(frame(1))
+        self.end_input()
+        self.assertEqual(list(port), [1])
+        self.assertTrue(port.eof)
+        self.assertIsNone(port.receive_batch())
+
+    def test_truncated_eof(self):
+        port = self.driver()
+        self.write(frame(1) + frame(2)[:-1])
+        self.end_input()
+        self.assertEqual(port.receive_batch(), [1])
+        with self.assertRaises(EOFError):
+            port.receive_batch()
+
+    def test_flush_each(self):
+        port = self.driver(flush=FLUSH_EACH)
+        port.send(1)
+        self.assertEqual(self.written(), frame(1))
+        port.send(2)
+        self.assertEqual(self.written(), frame(2))
+
+    def test_flush_batch(self):
+        port = self.driver(flush=FLUSH_BATCH)
+        self.write(frame(1) + frame(2))
+        replies = []
+        for batch in port.batches():
+            for term in batch:
+                port.send(term * 10)
+            replies.append(self.written())
+            self.end_input()
+        # Written together before waiting for more input
+        self.assertEqual(replies, [b''])
+        self.assertEqual(self.written(), frame(10) + frame(20))
+
+    def test_flush_manual(self):
+        size = len(frame(1))
+        port = self.driver(flush=FLUSH_MANUAL, flush_size=2 * size)
+        port.send(1)
+        self.assertEqual(self.written(), b'')
+        port.send(2)
+        self.assertEqual(self.written(), frame(1) + frame(2))
+        port.send(3)
+        self.assertEqual(self.written(), b'')
+        port.flush()
+        self.assertEqual(self.written(), frame(3))
+        self.assertEqual(port.outbuf, bytearray())
+
+    def test_serve(self):
+        port = self.driver()
+        self.write(frame(1) + frame(2) + frame(3))
+        self.end_input()
+        port.serve(lambda term: term * 2 if term != 2 else None)
+        self.assertEqual(self.written(), frame(2) + frame(6))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.driver(flush='never')
+
+class TestMailbox(unittest.TestCase):
+    def mailbox(self, data):
+        stdin = sys.stdin
+        sys.stdin = io.TextIOWrapper(io.BytesIO(data))
+        try:
+            return list(erlastic.mailbox_gen())
+        finally:
+            sys.stdin = stdin
+
+    def test_eof(self):
+        self.assertEqual(self.mailbox(b''), [])
+        self.assertEqual(self.mailbox(frame(1) + frame(2)), [1, 2])
+        # A partial length at the end ends the mailbox
+        self.assertEqual(self.mailbox(frame(1) + b'\x00\x00'), [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+
+from erlastic import Atom
+import perttirpc
+import shmring
+
+class Recorder(object):
+    """Socket wrapper keeping the frames sent through it"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.frames = []
+
+    def sendall(self, data):
+        self.frames.append(data[4:])
+        self.sock.sendall(data)
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def close(self):
+        self.sock.close()
+
+def doorbell(frame):
+    return frame[:1] == shmring.DOORBELL
+
+class TestRing(unittest.TestCase):
+    def test_wraparound(self):
+        mm = bytearray(shmring.HEADER_SIZE + 8)
+        ring = shmring.Ring(mm, 0, 8)
+        ring.write(6, b'abcd')
+        self.assertEqual(bytes(mm[shmring.HEADER_SIZE:]), b'cd\0\0\0\0ab')
+        self.assertEqual(bytes(ring.read(6, 4)), b'abcd')
+        ring.set_read_pos(10)
+        self.assertEqual(ring.read_pos(), 10)
+
+    def test_channel(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        client = shmring.Channel.create(16, tmpdir)
+        server = shmring.Channel.attach(client.path, 16)
+        self.addCleanup(client.close)
+        self.addCleanup(server.close)
+        with self.assertRaises(IOError):
+            shmring.Channel.attach(client.path, 32)
+
+        self.assertEqual(client.send(b'x' * 12),
+                         b'\0' + struct.pack('>QL', 0, 12))
+        # Full until the server has read the first frame
+        self.assertIsNone(client.send(b'abcdef'))
+        self.assertEqual(server.receive(b'\0' + struct.pack('>QL', 0, 12)), b'x' * 12)
+        ring = client.send(b'abcdef')
+        self.assertEqual(ring, b'\0' + struct.pack('>QL', 12, 6))
+        self.assertEqual(server.receive(ring), b'abcdef')
+
+class TestShm(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='shmring-')
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def connect(self, size, threshold):
+        path = os.path.join(self.tmpdir, 'echo.sock')
+        peer = shmring.EchoPeer(path)
+        self.addCleanup(peer.server.close)
+        def serve():
+            sock, _ = peer.server.accept()
+            peer.serve(sock)
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+
+        self.sock = Recorder(perttirpc.connect_unix(path))
+        conn = perttirpc.Connection(self.sock)
+        self.addCleanup(conn.close)
+        self.assertTrue(conn.enable_shm(size, threshold, self.tmpdir))
+        return conn
+
+    def echo(self, conn, data):
+        self.assertEqual(conn.call('echo', 'echo', [data]), data)
+        return self.sock.frames[-1]
+
+    def test_negotiation(self):
+        conn = self.connect(4096, 1024)
+        # The file is gone once both ends have it mapped
+        self.assertEqual(os.listdir(self.tmpdir), ['echo.sock'])
+        self.assertFalse(doorbell(self.echo(conn, b'small')))
+        self.assertEqual(conn.shm.rx.read_pos(), 0)
+
+        frame = self.echo(conn, b'x' * 2000)
+        self.assertTrue(doorbell(frame))
+        self.assertEqual(len(frame), 13)
+        # The reply came through the ring too
+        self.assertTrue(conn.shm.rx.read_pos() > 2000)
+
+    def test_wraparound(self):
+        conn = self.connect(4096, 1024)
+        for n in range(10):
+            data = os.urandom(1500)
+            self.assertTrue(doorbell(self.echo(conn, data)))
+        self.assertTrue(conn.shm.write_pos > 3 * 4096)
+        self.assertEqual(conn.shm.tx.read_pos(), conn.shm.write_pos)
+
+    def test_ring_full(self):
+        conn = self.connect(4096, 1024)
+        # Larger than the ring, both ways go over the socket
+        data = os.urandom(8000)
+        self.assertEqual(self.echo(conn, data)[:1], b'\x83')
+        self.assertEqual(conn.shm.write_pos, 0)
+        self.assertEqual(conn.shm.rx.read_pos(), 0)
+        self.assertTrue(doorbell(self.echo(conn, b'x' * 2000)))
+
+    def test_not_supported(self):
+        error = (Atom('error'), (Atom('server'), 2, b'NoSuchFunction', b'', []))
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        peer = perttirpc.Connection(theirs)
+        peer.send_packet4(peer.encoder.encode(error))
+
+        conn = perttirpc.Connection(ours)
+        self.assertFalse(conn.enable_shm(4096, 1024, self.tmpdir))
+        self.assertIsNone(conn.shm)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        size, data = peer.recv_packet4()
+        self.assertEqual(peer.decoder.decode(data)[2], 'shm_attach')
+
+    def test_pass_through(self):
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        conn = perttirpc.Connection(ours)
+        conn.shm = shmring.Channel.create(4096, self.tmpdir)
+        self.addCleanup(conn.shm.close)
+        server = shmring.Channel.attach(conn.shm.path, 4096)
+        self.addCleanup(server.close)
+
+        frames = [b'\x83abc', b'\x01\x00' * 20, server.send(b'\x83ring')]
+        for frame in frames:
+            theirs.sendall(struct.pack('>L', len(frame)) + frame)
+        self.assertEqual(conn.recv_packet4(), (4, b'\x83abc'))
+        self.assertEqual(conn.recv_packet4(), (40, b'\x01\x00' * 20))
+        self.assertEqual(conn.recv_packet4(), (5, b'\x83ring'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from erlastic import Atom
+import sudokubench
+
+class FakeSession(object):
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.closed = False
+
+    def reply(self):
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    solve = step = reply
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection(object):
+    def __init__(self, replies):
+        self.session = FakeSession(replies)
+
+    def open_session(self, grid):
+        return self.session
+
+def step(status, solved=[(1, 1)]):
+    return (Atom(status), b'0' * 81, solved, [])
+
+class TestRunPuzzle(unittest.TestCase):
+    def run_puzzle(self, verb, replies):
+        self.recorder = sudokubench.Recorder()
+        self.conn = FakeConnection(replies)
+        return sudokubench.run_puzzle(self.conn, '0' * 81, verb, self.recorder)
+
+    def test_outcomes(self):
+        self.assertEqual(self.run_puzzle('solve', [(Atom('solved'), b'1' * 81)]),
+                         'solved')
+        self.assertEqual(self.run_puzzle('solve', [(Atom('unsolved'), b'0' * 81)]),
+                         'unsolved')
+        self.assertEqual(self.run_puzzle('solve', [Atom('invalid_grid')]),
+                         'invalid_grid')
+        self.assertEqual(self.run_puzzle('step', [step('unsolved'), step('solved')]),
+                         'solved')
+        self.assertEqual(self.run_puzzle('step', [step('unsolved', [])]),
+                         'unsolved')
+        self.assertTrue(self.conn.session.closed)
+
+    def test_close_on_error(self):
+        with self.assertRaises(IOError):
+            self.run_puzzle('step', [step('unsolved'), IOError('Connection closed')])
+        self.assertTrue(self.conn.session.closed)
+        report = self.recorder.report()
+        self.assertEqual(report['verbs']['step']['errors'], 1)
+        self.assertEqual(report['verbs']['close']['count'], 1)
+
+    def test_report(self):
+        recorder = sudokubench.Recorder()
+        recorder.puzzle('a', 0.1, outcome='solved')
+        recorder.puzzle('b', 0.1, outcome='unsolved')
+        recorder.puzzle('a', 0.1, outcome='solved')
+        recorder.puzzle('b', error='IOError: x')
+        report = recorder.report()
+        self.assertEqual(report['outcomes'], {'solved': 2, 'unsolved': 1})
+        self.assertEqual(report['errors'], {'IOError: x': 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from sudokuboard import Board, cell_index, cell_pos
+
+# Row 1 has 5 and 3 given, (1, 3) and (1, 4) are open
+SOLVED = [((1, 1), 5), ((1, 2), 3)]
+CANDIDATES = [((1, 3), 1), ((1, 3), 2), ((1, 3), 4),
+              ((1, 4), 2), ((1, 4), 6)]
+
+def board():
+    b = Board()
+    b.load(SOLVED, CANDIDATES)
+    return b
+
+def state(b):
+    return (bytes(b.values), b.masks.tolist())
+
+class TestBoard(unittest.TestCase):
+    def test_cell_index(self):
+        for i in range(81):
+            self.assertEqual(cell_index(*cell_pos(i)), i)
+        self.assertEqual(cell_pos(0), (1, 1))
+        self.assertEqual(cell_pos(80), (9, 9))
+
+    def test_load(self):
+        b = board()
+        self.assertEqual(b.solved_cells(), SOLVED)
+        self.assertEqual(b.candidate_cells(), CANDIDATES)
+        self.assertEqual(b.to_string(), '53' + '0' * 79)
+        self.assertTrue(b.is_given(0))
+        self.assertFalse(b.is_given(2))
+        self.assertFalse(b.can_undo())
+        self.assertFalse(b.can_redo())
+
+    def test_make_delta_skips_no_ops(self):
+        b = board()
+        delta = b.make_delta([((1, 1), 5), ((1, 3), 4)],
+                             [((1, 3), 1), ((1, 3), 2), ((1, 4), 9)])
+        self.assertEqual(delta.solved.tolist(), [2, 4])
+        self.assertEqual(delta.removed.tolist(), [2, 0b11])
+
+    def test_undo_redo(self):
+        b = board()
+        start = state(b)
+        b.apply_step([], [((1, 3), 2), ((1, 4), 2)])
+        first = state(b)
+        b.apply_step([((1, 3), 4)], [((1, 3), 1), ((1, 3), 4)])
+        second = state(b)
+
+        self.assertEqual(b.to_string(), '534' + '0' * 78)
+        self.assertEqual(b.eliminated_cells(),
+                         [((1, 3), 1), ((1, 3), 2), ((1, 3), 4), ((1, 4), 2)])
+
+        b.undo()
+        self.assertEqual(state(b), first)
+        b.undo()
+        self.assertEqual(state(b), start)
+        self.assertFalse(b.can_undo())
+        b.redo()
+        b.redo()
+        self.assertEqual(state(b), second)
+        self.assertFalse(b.can_redo())
+
+    def test_apply_drops_redo_history(self):
+        b = board()
+        b.apply_step([], [((1, 3), 2)])
+        b.apply_step([], [((1, 4), 2)])
+        b.undo()
+        b.apply_step([], [((1, 4), 6)])
+        self.assertEqual(len(b.history), 2)
+        self.assertFalse(b.can_redo())
+        self.assertEqual(b.candidate_cells(),
+                         [((1, 3), 1), ((1, 3), 4), ((1, 4), 2)])
+
+    def test_seek(self):
+        b = board()
+        states = [state(b)]
+        for eliminated in CANDIDATES[:4]:
+            b.apply_step([], [eliminated])
+            states.append(state(b))
+        for step in [2, 0, 4, 1, 3]:
+            b.seek(step)
+            self.assertEqual(b.position, step)
+            self.assertEqual(state(b), states[step])
+        b.seek(-1)
+        self.assertEqual(b.position, 0)
+        b.seek(100)
+        self.assertEqual(b.position, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
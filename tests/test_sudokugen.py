@@ -0,0 +1,68 @@
+import random
+import unittest
+
+import sudokugen
+from sudokugen import Search, count_solutions, format_grid, parse_grid
+
+# Unique solution, solved by the Ruby tests as well
+GRID = '014600300050000007090840100000400800600050009007009000008016030300000010009008570'
+
+def valid_solution(cells):
+    units = ([[r * 9 + c for c in range(9)] for r in range(9)] +
+             [[r * 9 + c for r in range(9)] for c in range(9)] +
+             [[(b // 3 * 3 + r) * 9 + b % 3 * 3 + c
+               for r in range(3) for c in range(3)] for b in range(9)])
+    return all(sorted(cells[i] for i in unit) == list(range(1, 10))
+               for unit in units)
+
+class TestSearch(unittest.TestCase):
+    def test_unique(self):
+        search = Search(parse_grid(GRID))
+        self.assertEqual(search.count(2), 1)
+        self.assertTrue(valid_solution(search.solution))
+        for given, num in zip(parse_grid(GRID), search.solution):
+            self.assertTrue(given in (0, num))
+
+    def test_limit(self):
+        # Empty grid: counting stops at the limit
+        self.assertEqual(count_solutions('0' * 81, limit=1), 1)
+        self.assertEqual(count_solutions('0' * 81, limit=5), 5)
+
+    def test_invalid(self):
+        self.assertEqual(count_solutions('11' + '0' * 79), 0)
+        self.assertEqual(count_solutions('0' * 80 + '1'), 2)
+
+    def test_search_restores_state(self):
+        search = Search(parse_grid(GRID))
+        before = (list(search.cells), list(search.rows), list(search.empty))
+        search.count(2)
+        self.assertEqual((list(search.cells), list(search.rows),
+                          sorted(search.empty)),
+                         (before[0], before[1], sorted(before[2])))
+
+    def test_random_solution(self):
+        a = sudokugen.random_solution(random.Random('a'))
+        self.assertTrue(valid_solution(a))
+        self.assertEqual(a, sudokugen.random_solution(random.Random('a')))
+        self.assertNotEqual(a, sudokugen.random_solution(random.Random('b')))
+
+class TestGenerate(unittest.TestCase):
+    def test_generate(self):
+        for symmetry in sorted(sudokugen.SYMMETRIES):
+            grid, clues = sudokugen.generate('test', 30, symmetry)
+            cells = parse_grid(grid)
+            self.assertEqual(clues, sum(1 for num in cells if num))
+            self.assertTrue(clues <= 30)
+            self.assertEqual(count_solutions(grid), 1)
+            for i in range(81):
+                for j in sudokugen.SYMMETRIES[symmetry](i):
+                    self.assertEqual(bool(cells[i]), bool(cells[j]))
+
+    def test_deterministic(self):
+        self.assertEqual(sudokugen.generate('1:2'), sudokugen.generate('1:2'))
+
+    def test_gives_up(self):
+        self.assertIsNone(sudokugen.generate('x', clues=10, attempts=1))
+
+if __name__ == '__main__':
+    unittest.main()